@@ -0,0 +1,110 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+# Cold start benchmark: every mode runs in a fresh interpreter, imports what
+# efmplot.py / map_plot.py would import for it and exits. The run fails when
+# a mode goes over its budget or loads a subsystem it does not use.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+MODES = {
+    "efmplot-help": {
+        "code": "import sys; sys.argv = ['efmplot.py', '--help']; import efmplot; efmplot.parse_arguments()",
+        "budget": 0.3,
+        "forbidden": ["PyQt5", "pyqtgraph", "websockets", "asyncio", "numpy"],
+    },
+    "efmplot-headless": {
+        "code": "import efmplot; efmplot.load_subsystems(efmplot.parse_arguments([]))",
+        "budget": 0.6,
+        "forbidden": ["PyQt5.QtWidgets", "pyqtgraph", "websockets"],
+    },
+    "efmplot-websocket": {
+        "code": "import efmplot; efmplot.load_subsystems(efmplot.parse_arguments(['--websocket']))",
+        "budget": 0.8,
+        "forbidden": ["PyQt5.QtWidgets", "pyqtgraph"],
+    },
+    "efmplot-gui": {
+        "code": "import efmplot; efmplot.load_subsystems(efmplot.parse_arguments(['--gui', '--websocket']))",
+        "budget": 1.5,
+        "forbidden": [],
+    },
+    "map_plot-help": {
+        "code": "import sys; sys.argv = ['map_plot.py', '--help']; import runpy; runpy.run_path('map_plot.py', run_name='__main__')",
+        "budget": 0.5,
+        "forbidden": ["matplotlib", "cartopy", "pychmirad", "tqdm"],
+    },
+}
+
+REPORT = """
+import sys, json
+forbidden = {forbidden!r}
+def report():
+    loaded = sorted(m for m in forbidden if m in sys.modules)
+    sys.__stdout__.write("\\n@@" + json.dumps(loaded) + "\\n")
+import atexit
+atexit.register(report)
+"""
+
+
+def run_mode(name, mode):
+    code = REPORT.format(forbidden=mode["forbidden"]) + mode["code"]
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    loaded = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("@@"):
+            loaded = json.loads(line[2:])
+    ok = proc.returncode == 0
+    return elapsed, loaded, ok, proc.stderr.strip().splitlines()[-1:] if not ok else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start time benchmark for the efmplot tools.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per mode, the fastest one counts (default: 5)')
+    parser.add_argument('--mode', action='append', choices=sorted(MODES), help='Modes to run (default: all)')
+    parser.add_argument('--budget', action='append', default=[], metavar='MODE=SECONDS', help='Override the budget of a mode')
+    parser.add_argument('--json', type=str, help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    budgets = {name: mode["budget"] for name, mode in MODES.items()}
+    for item in args.budget:
+        name, value = item.split("=", 1)
+        budgets[name] = float(value)
+
+    results = {}
+    failed = False
+    for name in args.mode or list(MODES):
+        times = []
+        for _ in range(args.repeat):
+            elapsed, loaded, ok, error = run_mode(name, MODES[name])
+            if not ok:
+                break
+            times.append(elapsed)
+        if not ok:
+            print(f"{name:20s} ERROR  {' '.join(error)}")
+            results[name] = {"error": error}
+            failed = True
+            continue
+        best = min(times)
+        status = "ok"
+        if best > budgets[name]:
+            status = "SLOW"
+        if loaded:
+            status = "LOADS " + ",".join(loaded)
+        failed |= status != "ok"
+        print(f"{name:20s} {best * 1000:7.1f} ms  (budget {budgets[name] * 1000:.0f} ms)  {status}")
+        results[name] = {"seconds": best, "budget": budgets[name], "loaded_forbidden": loaded, "status": status}
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import numpy as np
+from rotating_log import open_log
+
+# Lock-in style estimate of the field from whole rotations: one batched rfft
+# along the sample axis, read out at the rotor fundamental. Uses every sample
+# of a rotation instead of two samples (11/29, 13/33) or the argmax/argmin pair.
+# The rfft bin of a harmonic is harmonic * rotations per frame, which is only
+# exact when a frame spans whole rotations; the EFM sends one frame per turn.
+
+
+def demodulate(block, harmonic=1, rotations=1):
+    """Amplitude and phase of one harmonic for every row of a 2D block.
+
+    block has shape (frames, samples) and every frame must span exactly
+    rotations whole rotor turns (1 for the EFM's one frame per turn). The
+    amplitude is the peak value of the fitted sinusoid in input units, the
+    phase is in radians (cosine phase at sample 0). The DC level does not
+    enter the estimate.
+    """
+    block = np.asarray(block)
+    if block.dtype != np.float64:
+        block = block.astype(np.float32)
+    n = block.shape[-1]
+    index = harmonic * rotations
+    if not 0 < index <= n // 2:
+        raise ValueError(f"Harmonic {harmonic} of {rotations} rotations per frame is not resolved by {n} samples")
+    component = np.fft.rfft(block, axis=-1)[..., index]
+    amplitude = np.abs(component) * (2.0 / n)
+    phase = np.angle(component)
+    return amplitude, phase
+
+
+def reference_phase(phase):
+    # Axis of the phase distribution; a field reversal shifts phase by pi,
+    # so the circular mean is taken over doubled angles
+    return np.angle(np.nanmean(np.exp(2j * np.asarray(phase)))) / 2
+
+
+def signed_amplitude(amplitude, phase, reference=None):
+    if reference is None:
+        reference = reference_phase(phase)
+    return amplitude * np.cos(phase - reference)
+
+
+def demodulate_chunks(source, harmonic=1, chunk_rows=1 << 16, columns=None, rotations=1):
+    """demodulate() over any row-sliceable 2D source (HDF5 dataset, memmap).
+
+    Rows are read chunk_rows at a time so memory stays bounded for
+    multi-million rotation archives. columns optionally crops the samples
+    of a rotation, e.g. slice(0, 40).
+    """
+    rows = source.shape[0]
+    amplitude = np.empty(rows, dtype=np.float32)
+    phase = np.empty(rows, dtype=np.float32)
+    chunks = getattr(source, "chunks", None)
+    if chunks:
+        # Whole HDF5 chunks per read
+        chunk_rows = max(chunk_rows // chunks[0], 1) * chunks[0]
+    for start in range(0, rows, chunk_rows):
+        stop = min(start + chunk_rows, rows)
+        block = source[start:stop] if columns is None else source[start:stop, columns]
+        amplitude[start:stop], phase[start:stop] = demodulate(block, harmonic, rotations)
+    return amplitude, phase
+
+
+def read_csv_log(path):
+    """Timestamps and the rotation block of an efmplot CSV log.
+
+    Only rows with the most common number of samples are kept, so the
+    block is rectangular; the count of dropped rows is returned too.
+    """
+    with open_log(path) as f:
+        lines = [line.rstrip().split(',') for line in f if line.strip()]
+    widths = np.array([len(line) for line in lines])
+    if len(widths) == 0:
+        return np.empty(0), np.empty((0, 0), dtype=np.int32), 0
+    width = np.bincount(widths).argmax()
+    good = [line for line in lines if len(line) == width]
+    try:
+        table = np.array(good, dtype=np.float64)
+    except ValueError:
+        table = np.array([row for row in (_parse_row(line) for line in good) if row is not None])
+    return table[:, 0], table[:, 1:].astype(np.int32), len(lines) - len(table)
+
+
+def _parse_row(line):
+    try:
+        return [float(x) for x in line]
+    except ValueError:
+        return None
+
+
+def demodulate_h5(path, harmonic=1, rotations=1):
+    import h5py
+    with h5py.File(path, "r") as f:
+        if "waveform" in f:
+            return demodulate_chunks(f["waveform"], harmonic, rotations=rotations)
+        found = []
+        f.visititems(lambda name, item: found.append(item) if not found and isinstance(item, h5py.Dataset) and item.ndim == 2 else None)
+        if not found:
+            raise ValueError(f"No 2D dataset in {path}")
+        return demodulate_chunks(found[0], harmonic, rotations=rotations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FFT lock-in demodulation of EFM rotation waveforms.')
+    parser.add_argument('file_path', type=str, help='CSV log (plain, .gz or .xz) or HDF5 waveform archive')
+    parser.add_argument('--harmonic', type=int, default=1, help='Harmonic of the rotation to read out (default: 1, the fundamental)')
+    parser.add_argument('--rotations', type=int, default=1, help='Whole rotor turns spanned by one frame (default: 1, one frame per turn)')
+    parser.add_argument('--output', type=str, help='Write time/index, amplitude, phase and signed amplitude to this CSV file')
+    args = parser.parse_args()
+
+    if args.file_path.endswith(".h5"):
+        amplitude, phase = demodulate_h5(args.file_path, args.harmonic, args.rotations)
+        index = np.arange(len(amplitude), dtype=np.float64)
+    else:
+        index, block, dropped = read_csv_log(args.file_path)
+        if dropped:
+            print(f"Skipped {dropped} malformed rows")
+        amplitude, phase = demodulate(block, args.harmonic, args.rotations)
+    signed = signed_amplitude(amplitude, phase)
+    print(f"{len(amplitude)} rotations, median amplitude {np.median(amplitude):.1f}, reference phase {np.degrees(reference_phase(phase)):.1f} deg")
+
+    if args.output:
+        np.savetxt(args.output, np.column_stack([index, amplitude, phase, signed]), delimiter=',',
+                   header='time,amplitude,phase,signed_amplitude', comments='', fmt='%.6f')
+
+
+if __name__ == "__main__":
+    main()
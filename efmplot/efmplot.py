@@ -1,188 +1,145 @@
 import sys
-from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget
-from PyQt5.QtCore import QThread, pyqtSignal, QIODevice
-from PyQt5.QtSerialPort import QSerialPort, QSerialPortInfo
-import pyqtgraph as pg
-import time 
-import sys
+import time
 import argparse
-from PyQt5.QtWidgets import QApplication
-import asyncio
-import websockets
 import signal
 import json
 
-class SerialReaderThread(QThread):
-    data_received = pyqtSignal(list)
-
-    def __init__(self, port_name, baudrate=9600, log_file=None, log_prefix = "EFM"):
-        super().__init__()
-        self.port = QSerialPort()
-        self.port.setPortName(port_name)
-        self.port.setBaudRate(baudrate)
-        self.port.readyRead.connect(self.read_data)
-        print("Serial read buffer size:", self.port.readBufferSize())
-        self.log_file = log_file
-        if not self.log_file:
-            self.log_file = log_prefix+"log_"+time.strftime("%Y%m%d_%H%M%S", time.gmtime()) + "_UTC.csv"
-        self.log_file_handle = open(self.log_file, 'a')
-        if not self.port.open(QIODevice.ReadOnly):
-            print(f"Failed to open port {port_name}")
-
-    def read_data(self):
-        while self.port.canReadLine():
-            data = self.port.readLine().data().decode().strip()
-            try:
-                #print("Read data", data)
-                #self.data_received.emit([-int(x)+(65536/2) for x in data.split(',')])
-                self.data_received.emit([int(x) for x in data.split(',')])
-                self.log_data(data)
-            except ValueError as e:
-                print(e)
-
-
-    def log_data(self, value):
-        timestamp = time.time()
-        log_entry = f"{timestamp},{value}\n"
-        self.log_file_handle.write(log_entry)
-        self.log_file_handle.flush()
-
-    def stop(self):
-        self.port.close()
-        self.log_file_handle.close()
-        self.quit()
-        self.wait()
-
-
-class WebsocketThread(QThread):
-    message_received = pyqtSignal(str)
-    broadcast_message = pyqtSignal(str)
-
-    def __init__(self, host, port, parent=None):
-        super(WebsocketThread, self).__init__(parent)
-        self.host = host
-        self.port = port
-        self.loop = None
-        self.clients = set()
-        self.running = True
-        self.broadcast_message.connect(self.handle_broadcast_message)
-
-    async def handler(self, websocket, path):
-        self.clients.add(websocket)
-        try:
-            async for message in websocket:
-                print(f"Received: {message}")
-                #self.message_received.emit(f"Received: {message}")
-        finally:
-            self.clients.remove(websocket)
-    
-    def handle_broadcast_message(self, message):
-        asyncio.run_coroutine_threadsafe(self.send_message_to_all(message), self.loop)
-
-    async def send_message_to_all(self, message):
-        if self.clients:
-            await asyncio.gather(*(client.send(message) for client in self.clients))
-
-    async def run_server(self):
-        async with websockets.serve(self.handler, self.host, self.port):
-            await asyncio.Future()
-
-    def run(self):
-        self.loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self.loop)
-        self.loop.run_until_complete(self.run_server())
-
-    def stop(self):
-        self.loop.call_soon_threadsafe(self.loop.stop)
-        self.running = False
-
-
-class MainWindow(QMainWindow):
-    serial_thread = None
-    def __init__(self, srt):
-        super().__init__()
-
-        self.setWindowTitle("Serial Data Plotter")
-        self.setGeometry(100, 100, 800, 600)
-
-        self.central_widget = QWidget()
-        self.setCentralWidget(self.central_widget)
-
-        self.layout = QVBoxLayout(self.central_widget)
-
-        self.plot_widget = pg.PlotWidget()
-        self.layout.addWidget(self.plot_widget)
-
-
-        #self.plot_widget.setYRange(-(65536/2), (65536/2))
-        self.plot_widget.setYRange(-10, 65546)
-        self.plot_widget.setXRange(0, 105)
-        self.plot_widget.showGrid(x=True, y=True)
-        
-        self.plot_data = []
-        self.plot = self.plot_widget.plot(self.plot_data, pen=pg.mkPen(width=5))
-
-        #self.serial_thread = SerialReaderThread(port)
-        self.serial_thread = srt
-        self.serial_thread.data_received.connect(self.add_data)
-        #self.serial_thread.start()
-
-    def add_data(self, value):
-        self.plot.setData(value)
-
-    def closeEvent(self, event):
-        self.serial_thread.stop()
-        self.plot_thread.stop()
-        event.accept()
-
-def main():
+# Qt, pyqtgraph, asyncio and websockets are imported in load_subsystems(),
+# only for the modes that use them, so --help and headless runs start fast.
+
+
+def parse_arguments(argv=None, default_view="live"):
     parser = argparse.ArgumentParser()
     parser.add_argument("--log_file", help="Log file to write data to", default=None)
     parser.add_argument("--log_prefix", default="EFM_THUNDERMILL01")
+    parser.add_argument("--log_dir", default=".", help="Root of the hourly YYYY/MM/DD log archive (used when --log_file is not given)")
+    parser.add_argument("--log_compress", default="gz", choices=["gz", "xz", "none"], help="Compression of closed hourly log segments")
+    parser.add_argument("--events", action="store_true", help="Detect steep field drops and field reversals in real time")
+    parser.add_argument("--event_log", default="events.jsonl", help="File the detected events are appended to, one JSON object per line")
+    parser.add_argument("--event_window", default=500, type=int, help="Rotations in the running statistics of the event detector")
+    parser.add_argument("--event_drop_sigma", default=5.0, type=float, help="Steep drop threshold in standard deviations of the rotation-to-rotation step")
+    parser.add_argument("--event_rearm_sigma", default=2.0, type=float, help="Steep drop detection re-arms above this many standard deviations")
+    parser.add_argument("--event_reversal_band", default=20.0, type=float, help="Field reversal hysteresis band around zero, in ADC units")
     parser.add_argument("--gui", action="store_true", help="Enable GUI mode")
+    parser.add_argument("--view", default=default_view, choices=["live", "history"], help="GUI view: last rotation only, or history with average")
+    parser.add_argument("--waterfall_rows", default=5000, type=int, help="Rotations kept in the waterfall panel of the history view")
     parser.add_argument("--port", default="/dev/ttyUSB0", help="Serial port to read data from")
+    parser.add_argument("--replay", default=None, metavar="FILE", help="Replay a recorded CSV log (plain, .gz, .xz) or HDF5 waveform file instead of reading the serial port")
+    parser.add_argument("--replay_speed", default=1.0, type=float, help="Replay speed-up relative to the recorded timestamps, 0 = as fast as possible")
+    parser.add_argument("--replay_rate", default=100.0, type=float, help="Rotation rate in Hz assumed for HDF5 files without timestamps")
     parser.add_argument("--baudrate", default=9600, type=int, help="Baudrate for serial port")
+    parser.add_argument("--shm", default=None, metavar="NAME", help="Publish parsed frames into the shared memory frame bus NAME for other local readers (see frame_bus.py)")
     parser.add_argument("--websocket", action="store_true", help="Enable websocket mode")
     parser.add_argument("--ws_port", default=1234, help="Websocket port ")
     parser.add_argument("--ws_min_period", default=0.25, type=float, help="Minimum period between websocket messages in seconds")
-    
-    args = parser.parse_args()
 
-    app = QApplication(sys.argv)
+    return parser.parse_args(argv)
+
+
+def load_subsystems(args):
+    # Imports only what the selected mode needs
+    modules = {}
+    if args.gui:
+        from PyQt5.QtWidgets import QApplication
+        from gui import WINDOWS
+        modules["Application"] = QApplication
+        modules["Window"] = WINDOWS[args.view]
+    else:
+        from PyQt5.QtCore import QCoreApplication
+        modules["Application"] = QCoreApplication
+    from PyQt5.QtCore import QTimer
+    modules["Timer"] = QTimer
+
+    if args.replay:
+        from replay import ReplayReaderThread
+        modules["ReplayReaderThread"] = ReplayReaderThread
+    else:
+        from serial_reader import SerialReaderThread
+        modules["SerialReaderThread"] = SerialReaderThread
+
+    if args.websocket:
+        from websocket_server import WebsocketThread
+        modules["WebsocketThread"] = WebsocketThread
+
+    if args.events:
+        from events import EventDetector, EventLog
+        from event_worker import EventWorker
+        modules["EventDetector"] = EventDetector
+        modules["EventLog"] = EventLog
+        modules["EventWorker"] = EventWorker
+    return modules
+
+
+def main(argv=None, default_view="live"):
+    args = parse_arguments(argv, default_view)
+    modules = load_subsystems(args)
+
+    app = modules["Application"](sys.argv)
 
     last_ws_message = time.time()
 
-    serial_thread = SerialReaderThread(args.port, args.baudrate, args.log_file, args.log_prefix)
+    if args.replay:
+        # Recorded frames go through the same signals as live serial data
+        serial_thread = modules["ReplayReaderThread"](args.replay, args.replay_speed, args.replay_rate, shm_name=args.shm)
+        if not args.gui:
+            serial_thread.finished.connect(app.quit)
+    else:
+        serial_thread = modules["SerialReaderThread"](args.port, args.baudrate, args.log_file, args.log_prefix, args.log_dir, args.log_compress, shm_name=args.shm)
     serial_thread.start()
 
+    if args.events:
+        detector = modules["EventDetector"](window=args.event_window, drop_sigma=args.event_drop_sigma,
+                                            rearm_sigma=args.event_rearm_sigma, reversal_band=args.event_reversal_band)
+        events = modules["EventWorker"](serial_thread.ring, detector, modules["EventLog"](args.event_log))
+        events.event_detected.connect(print)
+        serial_thread.frames_received.connect(events.process)
+        # events lives in its own thread; a lambda slot runs in the main
+        # thread, so stop() joins the worker instead of waiting on itself
+        app.aboutToQuit.connect(lambda: events.stop())
+        events.start()
+
     if args.websocket:
-        ws = WebsocketThread("0.0.0.0", args.ws_port)
+        ws = modules["WebsocketThread"]("0.0.0.0", args.ws_port)
         ws.start()
         ws.message_received.connect(print)
 
-        def process_data(data):
+        def process_data(start, count):
             # Nechci posilat WS zpravy prilis casto
+            nonlocal last_ws_message
             if (time.time() - last_ws_message) < args.ws_min_period:
                 return
-            
+            last_ws_message = time.time()
             payload = {
                 "type": "round",
-                "data": data
+                "data": serial_thread.ring.latest().tolist()
             }
             ws.broadcast_message.emit(json.dumps(payload))
 
-        serial_thread.data_received.connect(process_data)
+        serial_thread.frames_received.connect(process_data)
+        if args.events:
+            # Events are never throttled
+            events.event_detected.connect(ws.broadcast_message)
+
+    # Closes the log and the ring however the app ends, window or Ctrl+C;
+    # connected after events.stop() so the worker is gone before the ring closes
+    app.aboutToQuit.connect(lambda: serial_thread.stop())
 
     if args.gui:
-        window = MainWindow(srt = serial_thread)
+        if args.view == "history":
+            window = modules["Window"](srt=serial_thread, waterfall_rows=args.waterfall_rows)
+        else:
+            window = modules["Window"](srt=serial_thread)
         window.show()
-            
 
     # Aby to slo ukoncit pomoci Ctrl+C
     def signal_handler(signal, frame):
-        sys.exit(0)
+        app.quit()
 
     signal.signal(signal.SIGINT, signal_handler)
+    # Python handlers only run between Qt events, so wake up now and then
+    wakeup = modules["Timer"]()
+    wakeup.timeout.connect(lambda: None)
+    wakeup.start(200)
     sys.exit(app.exec_())
 
 
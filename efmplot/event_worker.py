@@ -0,0 +1,45 @@
+import json
+from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+
+
+class EventWorker(QObject):
+    """Runs an EventDetector on its own thread, fed by frames_received.
+
+    The reader only emits (start, count); the worker reads the frames from
+    the ring afterwards, so detection never delays parsing or logging.
+    Detected events go to the event log and out as JSON via event_detected.
+    """
+    event_detected = pyqtSignal(str)
+
+    def __init__(self, ring, detector, event_log=None):
+        super().__init__()
+        self.ring = ring
+        self.detector = detector
+        self.event_log = event_log
+        self.skipped = 0
+        self.thread = QThread()
+        self.moveToThread(self.thread)
+
+    def start(self):
+        self.thread.start()
+
+    @pyqtSlot(int, int)
+    def process(self, start, count):
+        # The detector works on a copy; frames the reader overwrote before or
+        # while it was made are skipped and counted
+        first, block, times = self.ring.read(start, count)
+        self.skipped += min(first - start, count)
+        if not len(block):
+            return
+        for event in self.detector.update(block, times):
+            if self.event_log:
+                self.event_log.write(event)
+            self.event_detected.emit(json.dumps(event))
+
+    def stop(self):
+        # Called from the main thread; the log is closed only once the
+        # worker thread has finished its last process()
+        self.thread.quit()
+        self.thread.wait()
+        if self.event_log:
+            self.event_log.close()
@@ -0,0 +1,104 @@
+import json
+import numpy as np
+from demod import demodulate
+
+# Streaming detector of steep field drops and field reversals. Everything is
+# kept as exponentially weighted running statistics, so each frame costs O(1)
+# no matter how long the detector runs.
+
+
+class EventDetector:
+    """Feeds on blocks of rotations, returns a list of event dicts.
+
+    Per rotation the signed fundamental amplitude (see demod.py) is the field
+    feature. A steep drop fires when the frame-to-frame step falls below
+    -drop_sigma running standard deviations of the step and re-arms once it
+    is back above -rearm_sigma. A reversal fires when the smoothed field
+    crosses from above +reversal_band to below -reversal_band or back.
+    """
+
+    def __init__(self, window=500, drop_sigma=5.0, rearm_sigma=2.0, reversal_band=20.0,
+                 smoothing=20, warmup=200, min_step=1.0):
+        self.alpha = 2.0 / (window + 1)
+        self.smooth_alpha = 2.0 / (smoothing + 1)
+        self.drop_sigma = drop_sigma
+        self.rearm_sigma = rearm_sigma
+        self.reversal_band = reversal_band
+        self.warmup = warmup
+        self.min_step = min_step
+
+        self.frames = 0
+        self.axis = 0j          # running mean of exp(2j * phase)
+        self.reference = None   # phase axis, frozen after warmup
+        self.last = None
+        self.step_mean = 0.0
+        self.step_var = 0.0
+        self.smoothed = None
+        self.armed = True
+        self.polarity = 0
+
+    def features(self, block):
+        amplitude, phase = demodulate(block)
+        if self.reference is None:
+            weights = np.exp(2j * phase.astype(np.float64))
+            for w in weights:
+                self.axis += self.alpha * (w - self.axis)
+            if self.frames + len(block) >= self.warmup:
+                self.reference = np.angle(self.axis) / 2
+            reference = np.angle(self.axis) / 2
+        else:
+            reference = self.reference
+        return amplitude * np.cos(phase - reference)
+
+    def update(self, block, times):
+        events = []
+        field = self.features(block)
+        for t, x in zip(times, field.tolist()):
+            self.frames += 1
+            if self.last is None:
+                self.last = x
+                self.smoothed = x
+                continue
+            step = x - self.last
+            self.last = x
+
+            std = max(np.sqrt(self.step_var), self.min_step)
+            z = (step - self.step_mean) / std
+            if self.frames > self.warmup:
+                if self.armed and z < -self.drop_sigma:
+                    self.armed = False
+                    events.append({"type": "event", "kind": "steep_drop", "time": float(t),
+                                   "field": x, "step": step, "sigma": z})
+                elif not self.armed and z > -self.rearm_sigma:
+                    self.armed = True
+
+            # Running mean and variance of the step
+            delta = step - self.step_mean
+            self.step_mean += self.alpha * delta
+            self.step_var = (1 - self.alpha) * (self.step_var + self.alpha * delta * delta)
+
+            self.smoothed += self.smooth_alpha * (x - self.smoothed)
+            if self.smoothed > self.reversal_band:
+                polarity = 1
+            elif self.smoothed < -self.reversal_band:
+                polarity = -1
+            else:
+                polarity = self.polarity
+            if self.frames > self.warmup and self.polarity and polarity != self.polarity:
+                events.append({"type": "event", "kind": "field_reversal", "time": float(t),
+                               "field": self.smoothed, "polarity": polarity})
+            self.polarity = polarity
+        return events
+
+
+class EventLog:
+    # One JSON object per line
+    def __init__(self, path):
+        self.handle = open(path, 'a')
+
+    def write(self, event):
+        self.handle.write(json.dumps(event) + "\n")
+        self.handle.flush()
+
+    def close(self):
+        self.handle.close()
@@ -0,0 +1,232 @@
+import os
+import time
+import atexit
+import argparse
+import numpy as np
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from frame_parser import FrameRing
+
+# Frame ring in POSIX shared memory: efmplot.py --shm NAME publishes every
+# parsed frame, any number of local processes read them through numpy views
+# of the same memory. Layout: int64 header, float64 times[capacity],
+# int32 data[capacity, width].
+
+MAGIC = 0x45464D42555331   # "EFMBUS1"
+HEADER_FIELDS = 8
+HEADER_BYTES = HEADER_FIELDS * 8
+# Header fields
+H_MAGIC, H_CAPACITY, H_WIDTH, H_SEQ, H_WRITING, H_PID, H_CLOSED = range(7)
+
+
+def _layout(shm, capacity, width):
+    header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+    times = np.ndarray((capacity,), dtype=np.float64, buffer=shm.buf, offset=HEADER_BYTES)
+    data = np.ndarray((capacity, width), dtype=np.int32, buffer=shm.buf, offset=HEADER_BYTES + capacity * 8)
+    return header, times, data
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _attach(name):
+    try:
+        return SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = SharedMemory(name=name)
+        # Older Pythons track attached segments too and would unlink the
+        # bus when a reader exits
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class SharedFrameRing(FrameRing):
+    """FrameRing whose storage is a shared memory segment, used by the publisher.
+
+    The segment is created when the frame width is known. push() first
+    announces the seq range it is about to overwrite (H_WRITING), writes the
+    rows in place and only then advances H_SEQ, so readers never see a
+    frame before it is complete and can tell when theirs got overwritten.
+    """
+
+    def __init__(self, name, capacity=65536, width=None):
+        self.name = name
+        self.shm = None
+        self.header = None
+        self._seq = 0
+        self._writing = 0
+        super().__init__(capacity, width, np.int32)
+        atexit.register(self.close)
+
+    @property
+    def seq(self):
+        return self._seq
+
+    @seq.setter
+    def seq(self, value):
+        self._seq = value
+        if self.header is not None:
+            self.header[H_SEQ] = value
+
+    @property
+    def writing(self):
+        return self._writing
+
+    @writing.setter
+    def writing(self, value):
+        # push() announces the range it overwrites before touching the rows
+        self._writing = value
+        if self.header is not None:
+            self.header[H_WRITING] = value
+
+    def allocate(self, width):
+        size = HEADER_BYTES + self.capacity * 8 + self.capacity * width * 4
+        try:
+            self.shm = SharedMemory(name=self.name, create=True, size=size)
+        except FileExistsError:
+            old = _attach(self.name)
+            old_header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=old.buf)
+            pid = int(old_header[H_PID])
+            live = old_header[H_MAGIC] == MAGIC and not old_header[H_CLOSED] and pid != os.getpid() and _pid_alive(pid)
+            del old_header
+            old.close()
+            if live:
+                raise RuntimeError(f"Frame bus {self.name} is already published by process {pid}")
+            # Left behind by a publisher that did not exit cleanly
+            old.unlink()
+            self.shm = SharedMemory(name=self.name, create=True, size=size)
+        self.width = width
+        self.header, self.times, self.data = _layout(self.shm, self.capacity, width)
+        self.header[:] = 0
+        self.header[H_CAPACITY] = self.capacity
+        self.header[H_WIDTH] = width
+        self.header[H_SEQ] = self._seq
+        self.header[H_WRITING] = self._writing
+        self.header[H_PID] = os.getpid()
+        # Magic last, readers wait for it
+        self.header[H_MAGIC] = MAGIC
+
+    def close(self):
+        if self.shm is None:
+            return
+        self.header[H_CLOSED] = 1
+        self.header = self.times = self.data = None
+        shm, self.shm = self.shm, None
+        try:
+            shm.close()
+        except BufferError:
+            # Some consumer still holds a view, the mapping goes with the process
+            pass
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class FrameBusReader(FrameRing):
+    """Reads a frame bus published by another process.
+
+    poll() returns the (first seq, count) of frames published since the last
+    call; views(), time_views() and latest() give zero-copy numpy views like
+    FrameRing. Frames overwritten before the reader got to them are counted
+    in lost, and intact(seq) tells whether views of frame seq onwards are
+    still valid after they have been used.
+    """
+
+    def __init__(self, name, start="latest", timeout=None):
+        self.name = name
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                self.shm = _attach(name)
+                header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+                if header[H_MAGIC] == MAGIC:
+                    break
+                del header
+                self.shm.close()
+            except FileNotFoundError:
+                pass
+            if deadline is not None and time.monotonic() > deadline:
+                raise FileNotFoundError(f"No frame bus named {name}")
+            time.sleep(0.1)
+        self.capacity = int(header[H_CAPACITY])
+        self.width = int(header[H_WIDTH])
+        self.dtype = np.int32
+        self.header, self.times, self.data = _layout(self.shm, self.capacity, self.width)
+        self.lost = 0
+        head = self.seq
+        self.next_seq = head if start == "latest" else max(head - self.capacity, 0)
+
+    @property
+    def seq(self):
+        return int(self.header[H_SEQ])
+
+    @property
+    def writing(self):
+        return int(self.header[H_WRITING])
+
+    @property
+    def closed(self):
+        return bool(self.header[H_CLOSED]) or not _pid_alive(int(self.header[H_PID]))
+
+    def poll(self):
+        head = self.seq
+        # Frames up to the one being written now may already be overwritten
+        oldest = self.writing - self.capacity
+        if self.next_seq < oldest:
+            self.lost += oldest - self.next_seq
+            self.next_seq = oldest
+        start, count = self.next_seq, max(head - self.next_seq, 0)
+        self.next_seq = head
+        return start, count
+
+    def wait(self, timeout=None, interval=0.005):
+        # Polls until new frames arrive, the publisher goes away or timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.seq == self.next_seq and not self.closed:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(interval)
+        return self.poll()
+
+    def close(self):
+        self.header = self.times = self.data = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the frame rate and losses of a frame bus published by efmplot.py --shm.')
+    parser.add_argument('name', help='Name of the shared memory frame bus')
+    parser.add_argument('--interval', default=1.0, type=float, help='Seconds between reports')
+    args = parser.parse_args()
+
+    bus = FrameBusReader(args.name, timeout=10)
+    print(f"Attached to {args.name}: {bus.capacity} frames x {bus.width} samples")
+    frames = 0
+    last = time.monotonic()
+    while not bus.closed:
+        start, count = bus.wait(args.interval)
+        frames += count
+        now = time.monotonic()
+        if now - last >= args.interval:
+            latest = bus.latest()
+            print(f"seq {bus.seq}: {frames / (now - last):.1f} frames/s, lost {bus.lost}, "
+                  f"latest min {latest.min()} max {latest.max()}")
+            frames = 0
+            last = now
+    print("Publisher closed the bus")
+    bus.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import numpy as np
+
+VALID_BYTES = b'0123456789,-'
+
+
+def _plain_integers(joined):
+    # Comma separated integers only: no stray bytes, no empty fields and a
+    # minus sign only at the start of a field, followed by a digit
+    if joined.translate(None, VALID_BYTES):
+        return False
+    rest = joined[1:] if joined.startswith(b'-') else joined
+    rest = rest.replace(b',-', b',')
+    return bool(rest) and b'-' not in rest and b',,' not in rest and not rest.startswith(b',') and not rest.endswith(b',')
+
+
+class FrameRing:
+    """Preallocated ring of frames (rows) with their arrival timestamps.
+
+    seq counts every frame ever pushed; frame seq lives in row seq % capacity
+    until capacity newer frames overwrite it. Consumers get (seq, count)
+    and read views from the ring instead of receiving copies. A consumer
+    running on another thread than the writer uses read(), which copies and
+    leaves out frames the writer overwrote before or during the copy.
+    """
+
+    def __init__(self, capacity=65536, width=None, dtype=np.int32):
+        self.capacity = capacity
+        self.dtype = dtype
+        self.width = None
+        self.data = None
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.seq = 0
+        # Frames before writing - capacity may already be overwritten
+        self.writing = 0
+        if width:
+            self.allocate(width)
+
+    def allocate(self, width):
+        self.width = width
+        self.data = np.zeros((self.capacity, width), dtype=self.dtype)
+
+    def push(self, rows, t):
+        # rows: 2D array, t: one time for all rows or one per row;
+        # returns the seq of the first pushed frame
+        start = self.seq
+        n = len(rows)
+        self.writing = start + n
+        t = np.asarray(t, dtype=np.float64)
+        if n > self.capacity:
+            rows = rows[-self.capacity:]
+            if t.ndim:
+                t = t[-self.capacity:]
+            start += n - self.capacity
+            n = self.capacity
+        pos = start % self.capacity
+        first = min(n, self.capacity - pos)
+        self.data[pos:pos + first] = rows[:first]
+        self.data[:n - first] = rows[first:]
+        self.times[pos:pos + first] = t[:first] if t.ndim else t
+        self.times[:n - first] = t[first:] if t.ndim else t
+        self.seq = start + n
+        return start
+
+    def frame(self, seq):
+        return self.data[seq % self.capacity]
+
+    def latest(self):
+        return self.frame(self.seq - 1)
+
+    def _spans(self, start, count):
+        count = min(count, self.seq - start, self.capacity)
+        pos = start % self.capacity
+        if pos + count <= self.capacity:
+            return [slice(pos, pos + count)]
+        return [slice(pos, self.capacity), slice(0, pos + count - self.capacity)]
+
+    def views(self, start, count):
+        # One or two views covering frames start .. start + count - 1
+        return [self.data[s] for s in self._spans(start, count)]
+
+    def time_views(self, start, count):
+        return [self.times[s] for s in self._spans(start, count)]
+
+    def intact(self, start):
+        # Frames from start onwards have not been overwritten (yet)
+        return self.writing - start <= self.capacity
+
+    def read(self, start, count):
+        """(first seq, frames, times) copies of frames start .. start + count - 1.
+
+        Frames overwritten before or while they are copied are left out, so
+        the returned first seq may be later than start and fewer frames come
+        back than asked for.
+        """
+        oldest = self.writing - self.capacity
+        if start < oldest:
+            count -= oldest - start
+            start = oldest
+        if count <= 0 or self.data is None:
+            return start, np.empty((0, self.width or 0), dtype=self.dtype), np.empty(0)
+        data = np.concatenate(self.views(start, count))
+        times = np.concatenate(self.time_views(start, count))
+        # Checked again after the copy, the writer may have lapped it meanwhile
+        lapped = self.writing - self.capacity - start
+        if lapped > 0:
+            data, times, start = data[lapped:], times[lapped:], start + lapped
+        return start, data, times
+
+
+class FrameParser:
+    """Turns raw serial bytes into ring rows in bulk.
+
+    feed() takes whatever bytes are available, keeps the incomplete tail for
+    the next call and converts all complete lines of the expected width with
+    one vectorized parse. Lines of another width or with stray characters are
+    only counted in malformed. The port usually opens in the middle of a
+    line, so everything up to the first newline is dropped unless synced.
+    """
+
+    def __init__(self, ring, synced=False):
+        self.ring = ring
+        self.pending = b''
+        self.malformed = 0
+        self.synced = synced
+
+    def feed(self, data, t):
+        """Returns (first seq, count, accepted lines as bytes)."""
+        buf = self.pending + data
+        if not self.synced:
+            first = buf.find(b'\n')
+            if first < 0:
+                self.pending = b''
+                return self.ring.seq, 0, []
+            buf = buf[first + 1:]
+            self.synced = True
+        end = buf.rfind(b'\n')
+        if end < 0:
+            self.pending = buf
+            return self.ring.seq, 0, []
+        self.pending = buf[end + 1:]
+        lines = [line.strip() for line in buf[:end].split(b'\n')]
+        lines = [line for line in lines if line]
+        if not lines:
+            return self.ring.seq, 0, []
+
+        if self.ring.width is None:
+            # Most common width of the first batch, a stray line cannot fix it
+            self.ring.allocate(int(np.bincount([line.count(b',') + 1 for line in lines]).argmax()))
+        width = self.ring.width
+        good = [line for line in lines if line.count(b',') == width - 1]
+
+        rows = None
+        joined = b','.join(good)
+        if good and _plain_integers(joined):
+            try:
+                values = np.fromstring(joined.decode('ascii'), dtype=np.int64, sep=',')
+            except ValueError:
+                values = None
+            if values is not None and values.size == len(good) * width:
+                rows = values.reshape(len(good), width)
+        if rows is None:
+            good, rows = self._parse_slow(good, width)
+
+        self.malformed += len(lines) - len(good)
+        if not good:
+            return self.ring.seq, 0, []
+        start = self.ring.push(rows, t)
+        return start, len(good), good
+
+    def _parse_slow(self, lines, width):
+        # Fallback when the batch contains a bad token, line by line
+        good = []
+        rows = []
+        for line in lines:
+            try:
+                row = [int(x) for x in line.split(b',')]
+            except ValueError:
+                continue
+            good.append(line)
+            rows.append(row)
+        return good, np.array(rows, dtype=np.int64).reshape(len(rows), width)
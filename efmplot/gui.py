@@ -0,0 +1,223 @@
+from PyQt5.QtWidgets import QMainWindow, QVBoxLayout, QWidget
+from PyQt5.QtCore import QTimer
+import pyqtgraph as pg
+import numpy as np
+from demod import demodulate
+
+
+class MainWindow(QMainWindow):
+    serial_thread = None
+    def __init__(self, srt):
+        super().__init__()
+
+        self.setWindowTitle("Serial Data Plotter")
+        self.setGeometry(100, 100, 800, 600)
+
+        self.central_widget = QWidget()
+        self.setCentralWidget(self.central_widget)
+
+        self.layout = QVBoxLayout(self.central_widget)
+
+        self.plot_widget = pg.PlotWidget()
+        self.layout.addWidget(self.plot_widget)
+
+
+        #self.plot_widget.setYRange(-(65536/2), (65536/2))
+        self.plot_widget.setYRange(-10, 65546)
+        self.plot_widget.setXRange(0, 105)
+        self.plot_widget.showGrid(x=True, y=True)
+        
+        self.plot_data = []
+        self.plot = self.plot_widget.plot(self.plot_data, pen=pg.mkPen(width=5))
+
+        #self.serial_thread = SerialReaderThread(port)
+        self.serial_thread = srt
+        self.serial_thread.frames_received.connect(self.add_frames)
+        #self.serial_thread.start()
+
+    def add_frames(self, start, count):
+        # Only the newest frame is drawn, read straight from the reader's ring
+        self.plot.setData(self.serial_thread.ring.latest())
+
+    def closeEvent(self, event):
+        self.serial_thread.stop()
+        event.accept()
+
+
+class HistoryWindow(QMainWindow):
+    serial_thread = None
+    Y_OFFSET = 0
+
+    def __init__(self, srt, waterfall_rows=5000, waterfall_fps=10):
+        super().__init__()
+
+        self.setWindowTitle("Serial Data Plotter")
+        self.setGeometry(100, 100, 800, 600)
+
+        self.central_widget = QWidget()
+        self.setCentralWidget(self.central_widget)
+
+        self.layout = QVBoxLayout(self.central_widget)
+
+        self.plot_widget = pg.PlotWidget()
+        self.layout.addWidget(self.plot_widget)
+
+        self.plot_widget.setYRange(-10, 65546)
+        self.plot_widget.setXRange(0, 105)
+        self.plot_widget.showGrid(x=True, y=True)
+
+        self.raw_plots = []
+        self.last_curve = None   # výrazně zvýrazněný poslední průběh
+        self.avg_plot = None     # průměrný průběh
+        self.text_item = None   # textový popisek do grafu
+
+        self.delta_lines = []
+
+        self.history = []
+        self.max_history = 30
+
+        # Waterfall: preallocated ring of rotations (rows) x samples, newest row
+        # at the cursor. Rows are written in place, the image is pushed to the
+        # GPU at most waterfall_fps times per second.
+        self.waterfall_widget = pg.PlotWidget()
+        self.waterfall_widget.setLabel('bottom', 'Sample in rotation')
+        self.waterfall_widget.setLabel('left', 'Rotation (ring, newest at cursor)')
+        self.waterfall_widget.invertY(True)
+        self.layout.addWidget(self.waterfall_widget)
+        self.waterfall_image = pg.ImageItem(axisOrder='row-major')
+        self.waterfall_image.setLookupTable(pg.colormap.get('viridis').getLookupTable())
+        self.waterfall_widget.addItem(self.waterfall_image)
+        self.waterfall_cursor = pg.InfiniteLine(pos=0, angle=0, pen=pg.mkPen(color=(255, 0, 0), width=1))
+        self.waterfall_widget.addItem(self.waterfall_cursor)
+        self.waterfall_rows = waterfall_rows
+        self.waterfall = None
+        self.waterfall_pos = 0
+        self.waterfall_dirty = False
+        self.waterfall_timer = QTimer(self)
+        self.waterfall_timer.timeout.connect(self.update_waterfall)
+        self.waterfall_timer.start(int(1000 / waterfall_fps))
+
+        self.serial_thread = srt
+        self.serial_thread.frames_received.connect(self.add_frames)
+
+    def add_frames(self, start, count):
+        # Copies checked against the writer; a fast replay may lap the ring
+        # before this queued slot runs, those frames are skipped
+        start, block, _ = self.serial_thread.ring.read(start, count)
+        if not len(block):
+            return
+        self.add_waterfall_rows(block - self.Y_OFFSET)
+        # The curve overlay is redrawn once per batch, from its newest frames
+        for row in block[-self.max_history:-1]:
+            self.history.append(row - self.Y_OFFSET)
+        self.add_data(block[-1])
+
+    def add_waterfall_rows(self, block):
+        if self.waterfall is None:
+            self.waterfall = np.full((self.waterfall_rows, block.shape[1]), np.nan, dtype=np.float32)
+        block = block[-self.waterfall_rows:]
+        n = min(block.shape[1], self.waterfall.shape[1])
+        pos = self.waterfall_pos
+        first = min(len(block), self.waterfall_rows - pos)
+        self.waterfall[pos:pos + first, :n] = block[:first, :n]
+        self.waterfall[:len(block) - first, :n] = block[first:, :n]
+        self.waterfall_pos = (pos + len(block)) % self.waterfall_rows
+        self.waterfall_dirty = True
+
+    def update_waterfall(self):
+        if not self.waterfall_dirty:
+            return
+        self.waterfall_dirty = False
+        levels = (np.nanmin(self.waterfall), np.nanmax(self.waterfall))
+        if levels[0] == levels[1]:
+            levels = (levels[0] - 1, levels[1] + 1)
+        self.waterfall_image.setImage(self.waterfall, autoLevels=False, levels=levels)
+        self.waterfall_cursor.setPos(self.waterfall_pos)
+    
+    def add_data(self, value):
+        data_array = np.array(value) - self.Y_OFFSET
+        self.history.append(data_array)
+        while len(self.history) > self.max_history:
+            self.history.pop(0)
+    
+        for plot in self.raw_plots:
+            self.plot_widget.removeItem(plot)
+        self.raw_plots = []
+    
+        # Smazat staré svislé čáry
+        for line in self.delta_lines:
+            self.plot_widget.removeItem(line)
+        self.delta_lines = []
+    
+        # Historické průběhy (kromě posledního)
+        for h in self.history[:-1]:
+            plot = self.plot_widget.plot(h, pen=pg.mkPen(color=(180, 180, 180, 60), width=1))
+            self.raw_plots.append(plot)
+    
+        # Zvýrazněný poslední průběh
+        if self.last_curve:
+            self.plot_widget.removeItem(self.last_curve)
+        self.last_curve = self.plot_widget.plot(self.history[-1], pen=pg.mkPen(color=(255, 215, 0), width=3))
+    
+        # Klouzavý průměr - šířka 4
+        if self.avg_plot:
+            self.plot_widget.removeItem(self.avg_plot)
+        avg_data = None
+        if len(self.history) >= 2:
+            min_len = min(len(h) for h in self.history)
+            trimmed_data = np.array([h[:min_len] for h in self.history])
+            avg_data = np.mean(trimmed_data, axis=0)
+            self.avg_plot = self.plot_widget.plot(avg_data, pen=pg.mkPen(color=(0, 255, 255), width=4))
+        else:
+            self.avg_plot = None
+    
+        # Svislé čáry pro indexy 11 a 29
+        max_x = 0
+        if len(self.history) > 0:
+            last_data = self.history[-1]
+            max_x = len(last_data) - 1
+            if max_x >= 29:
+                for idx in [11, 29]:
+                    line = pg.InfiniteLine(pos=idx, angle=90, pen=pg.mkPen(color=(200, 200, 255, 150), width=2, style=pg.QtCore.Qt.DashLine))
+                    self.plot_widget.addItem(line)
+                    self.delta_lines.append(line)
+    
+        # Text
+        if self.text_item:
+            self.plot_widget.removeItem(self.text_item)
+    
+        avg_delta = None
+        last_delta = None
+        if len(self.history) > 0:
+            last_data = self.history[-1]
+            if avg_data is not None and len(avg_data) >= 30:
+                avg_delta = int(round(avg_data[29] - avg_data[11]))
+            if len(last_data) >= 30:
+                last_delta = int(round(last_data[29] - last_data[11]))
+
+        # Lock-in amplitude of the fundamental over the whole history
+        demod_amp = None
+        if avg_data is not None:
+            min_len = len(avg_data)
+            amplitude, _ = demodulate(np.array([h[:min_len] for h in self.history]))
+            demod_amp = int(round(float(np.mean(amplitude))))
+    
+        txt = f"Avg Δ: {avg_delta if avg_delta is not None else '-------':>7}   Last Δ: {last_delta if last_delta is not None else '-------':>7}   Demod A: {demod_amp if demod_amp is not None else '-------':>7}"
+    
+        self.text_item = pg.TextItem(txt, color='w', anchor=(0,0))
+        font = self.text_item.textItem.font()
+        font.setPointSize(16)
+        self.text_item.setFont(font)
+        self.plot_widget.addItem(self.text_item)
+        self.text_item.setPos(0, 0)
+        
+    def closeEvent(self, event):
+        self.waterfall_timer.stop()
+        self.serial_thread.stop()
+        event.accept()
+
+
+WINDOWS = {
+    "live": MainWindow,
+    "history": HistoryWindow,
+}
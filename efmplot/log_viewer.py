@@ -0,0 +1,344 @@
+import os
+import sys
+import json
+import argparse
+import warnings
+import numpy as np
+from rotating_log import open_log
+
+# Interactive viewer of long efmplot CSV logs. The logs are parsed once into a
+# cache directory of raw memory-mapped arrays: timestamps, the rotation
+# frames, signed p2p and max phase of every rotation, and a min/max pyramid
+# of both series (each level FACTOR times coarser). The viewer only draws the
+# rotations inside the visible range, from the pyramid level that gives about
+# one min/max pair per pixel, so panning costs the same for 10^3 and 10^8
+# rotations. Clicking a point shows the waveform of that rotation.
+#
+# PyQt5 and pyqtgraph are imported in make_viewer(), --build_only runs without them.
+
+CACHE_VERSION = 1
+FACTOR = 16
+# Coarsest pyramid level is the first one with at most this many bins
+MIN_LEVEL_BINS = 4096
+BATCH_LINES = 1 << 16
+SERIES = ("p2p", "angle")
+
+
+def signed_p2p(block):
+    # Peak-to-peak per row, negative when the minimum comes after the maximum (as ptp_orient in plot_record.py)
+    span = block.max(axis=1) - block.min(axis=1)
+    return np.where(block.argmin(axis=1) < block.argmax(axis=1), span, -span).astype(np.float32)
+
+
+def max_phase(block):
+    # Position of the maximum within the rotation, 0-1 of its length
+    return (block.argmax(axis=1) / block.shape[1]).astype(np.float32)
+
+
+def parse_batch(lines, width):
+    """(times, frames) of the lines with exactly width comma separated fields."""
+    good = [line for line in lines if line.count(',') == width - 1]
+    if not good:
+        return np.empty(0), np.empty((0, width - 1), dtype=np.int32)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            table = np.fromstring(",".join(good), sep=",")
+    except ValueError:
+        # Empty field somewhere in the batch
+        table = np.empty(0)
+    if table.size != len(good) * width:
+        # Some field is not a number, sort the rows out one by one
+        rows = []
+        for line in good:
+            try:
+                rows.append([float(x) for x in line.split(',')])
+            except ValueError:
+                continue
+        table = np.array(rows, dtype=np.float64).reshape(-1, width)
+    table = table.reshape(-1, width)
+    return table[:, 0], table[:, 1:].astype(np.int32)
+
+
+def read_batches(paths, batch_lines=BATCH_LINES):
+    # Line batches of all logs in turn, blank lines skipped
+    for path in paths:
+        with open_log(path) as f:
+            batch = []
+            for line in f:
+                line = line.strip()
+                if line:
+                    batch.append(line)
+                if len(batch) >= batch_lines:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+
+def _reduce(source, factor, rows, out, chunk_bins=1 << 16):
+    # One pyramid level from the previous one (or the series itself), streamed in chunks
+    pairs = source.ndim == 2
+    bins = -(-rows // factor)
+    for b0 in range(0, bins, chunk_bins):
+        b1 = min(b0 + chunk_bins, bins)
+        lo = np.asarray(source[b0 * factor:min(b1 * factor, rows)])
+        pad = (b1 - b0) * factor - len(lo)
+        if pad:
+            # Repeating the last value leaves min and max of the partial bin alone
+            lo = np.concatenate([lo, np.repeat(lo[-1:], pad, axis=0)])
+        lo = lo.reshape((b1 - b0, factor) + lo.shape[1:])
+        if pairs:
+            out[b0:b1, 0] = lo[:, :, 0].min(axis=1)
+            out[b0:b1, 1] = lo[:, :, 1].max(axis=1)
+        else:
+            out[b0:b1, 0] = lo.min(axis=1)
+            out[b0:b1, 1] = lo.max(axis=1)
+    return bins
+
+
+class LogCache:
+    """Memory-mapped arrays of one or more logs, rebuilt when the logs change.
+
+    times[i], frames[i], p2p[i] and angle[i] belong to rotation i;
+    levels[name][k] is the (bins, 2) min/max pyramid level k of a series,
+    bin j covering rotations j * factor**(k+1) onwards.
+    """
+
+    def __init__(self, paths, cache_dir=None, rebuild=False, factor=FACTOR, verbose=True):
+        self.paths = [os.path.abspath(p) for p in paths]
+        self.cache_dir = cache_dir or self.paths[0] + ".cache"
+        self.verbose = verbose
+        meta = None if rebuild else self._load_meta()
+        if meta is None or meta.get("factor") != factor:
+            meta = self._build(factor)
+        self.meta = meta
+        self.factor = meta["factor"]
+        self.rows = meta["rows"]
+        self.width = meta["width"]
+        self.times = self._map("times.f8", np.float64, (self.rows,))
+        self.frames = self._map("frames.i4", np.int32, (self.rows, self.width))
+        self.series = {name: self._map(f"{name}.f4", np.float32, (self.rows,)) for name in SERIES}
+        self.levels = {name: [self._map(f"{name}_{k}.f4", np.float32, (bins, 2)) for k, bins in enumerate(meta["levels"])]
+                       for name in SERIES}
+
+    def _sources(self):
+        return [[p, os.path.getmtime(p), os.path.getsize(p)] for p in self.paths]
+
+    def _load_meta(self):
+        try:
+            with open(os.path.join(self.cache_dir, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != CACHE_VERSION or meta.get("sources") != self._sources():
+            return None
+        return meta
+
+    def _map(self, name, dtype, shape):
+        if not shape[0]:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(os.path.join(self.cache_dir, name), dtype=dtype, mode="r", shape=shape)
+
+    def _build(self, factor):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        meta_path = os.path.join(self.cache_dir, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        files = {name: open(os.path.join(self.cache_dir, name), "wb")
+                 for name in ("times.f8", "frames.i4") + tuple(f"{s}.f4" for s in SERIES)}
+        rows = dropped = unordered = 0
+        width = None
+        last_time = -np.inf
+        try:
+            for batch in read_batches(self.paths):
+                if width is None:
+                    # Fields per line (time + samples) fixed by the first batch, other rows are dropped
+                    width = int(np.bincount([line.count(',') + 1 for line in batch]).argmax())
+                times, frames = parse_batch(batch, width)
+                dropped += len(batch) - len(times)
+                if not len(times):
+                    continue
+                unordered += int(np.count_nonzero(np.diff(times) < 0)) + int(times[0] < last_time)
+                last_time = times[-1]
+                files["times.f8"].write(times.astype(np.float64).tobytes())
+                files["frames.i4"].write(frames.tobytes())
+                files["p2p.f4"].write(signed_p2p(frames).tobytes())
+                files["angle.f4"].write(max_phase(frames).tobytes())
+                rows += len(times)
+                if self.verbose and rows % (BATCH_LINES * 16) < len(times):
+                    print(f"  - {rows} rotations parsed")
+        finally:
+            for f in files.values():
+                f.close()
+
+        # Both series have the same length and so the same level sizes
+        levels = []
+        for name in SERIES:
+            source = np.memmap(os.path.join(self.cache_dir, f"{name}.f4"), dtype=np.float32, mode="r", shape=(rows,)) if rows else None
+            n = rows
+            k = 0
+            name_levels = []
+            while source is not None and n > MIN_LEVEL_BINS:
+                bins = -(-n // factor)
+                out = np.memmap(os.path.join(self.cache_dir, f"{name}_{k}.f4"), dtype=np.float32, mode="w+", shape=(bins, 2))
+                _reduce(source, factor, n, out)
+                out.flush()
+                name_levels.append(bins)
+                source, n, k = out, bins, k + 1
+            levels = name_levels
+
+        meta = {"version": CACHE_VERSION, "sources": self._sources(), "rows": rows, "width": (width or 1) - 1,
+                "factor": factor, "levels": levels, "dropped": dropped, "unordered": unordered}
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(meta_path + ".tmp", meta_path)
+        if self.verbose:
+            print(f"Cached {rows} rotations of {meta['width']} samples in {self.cache_dir}, {dropped} malformed rows dropped")
+        if unordered:
+            print(f"Warning: timestamps go backwards {unordered} times, pass the logs in time order")
+        return meta
+
+    def index_range(self, t0, t1):
+        # Rotations [i0, i1) inside [t0, t1] plus one on each side so lines reach the edges
+        i0 = max(int(np.searchsorted(self.times, t0)) - 1, 0)
+        i1 = min(int(np.searchsorted(self.times, t1, side="right")) + 1, self.rows)
+        return i0, i1
+
+    def decimate(self, name, i0, i1, max_bins):
+        """(x, y) of series name over rotations [i0, i1), about 2 * max_bins points.
+
+        The level is the finest one with no more than 4 * max_bins bins in the
+        range; each bin gives its min and max at the time of its first rotation.
+        """
+        series = self.series[name]
+        if i1 - i0 <= 2 * max_bins or not self.levels[name]:
+            return np.asarray(self.times[i0:i1]), np.asarray(series[i0:i1])
+        k = 0
+        size = self.factor
+        while k + 1 < len(self.levels[name]) and (i1 - i0) / size > 4 * max_bins:
+            k += 1
+            size *= self.factor
+        b0, b1 = i0 // size, -(-i1 // size)
+        pairs = np.asarray(self.levels[name][k][b0:b1])
+        # Strided read of the times, one page per bin at most
+        x = np.asarray(self.times[b0 * size:min(b1 * size, self.rows):size])
+        return np.repeat(x, 2), pairs.ravel()
+
+    def pick(self, t, half_width, name="p2p"):
+        """Rotation at time t: the nearest one, or the largest |value| within t +- half_width."""
+        if not self.rows:
+            return None
+        j0 = int(np.searchsorted(self.times, t - half_width))
+        j1 = int(np.searchsorted(self.times, t + half_width, side="right"))
+        if j1 - j0 > 1:
+            return j0 + int(np.abs(np.asarray(self.series[name][j0:j1])).argmax())
+        i = min(int(np.searchsorted(self.times, t)), self.rows - 1)
+        if i > 0 and abs(self.times[i - 1] - t) < abs(self.times[i] - t):
+            i -= 1
+        return i
+
+
+def make_viewer(cache, refresh_ms=30):
+    from PyQt5.QtWidgets import QMainWindow, QVBoxLayout, QWidget
+    from PyQt5.QtCore import QTimer
+    import pyqtgraph as pg
+    from datetime import datetime, timezone
+
+    class LogViewer(QMainWindow):
+        def __init__(self):
+            super().__init__()
+            self.cache = cache
+            self.setWindowTitle(f"EFM log viewer - {os.path.basename(cache.paths[0])}")
+            self.setGeometry(100, 100, 1200, 800)
+
+            self.central_widget = QWidget()
+            self.setCentralWidget(self.central_widget)
+            self.layout = QVBoxLayout(self.central_widget)
+
+            self.p2p_plot = pg.PlotWidget(axisItems={"bottom": pg.DateAxisItem(utcOffset=0)})
+            self.p2p_plot.setLabel("left", "peak-to-peak amplitude", color="b")
+            self.angle_plot = pg.PlotWidget(axisItems={"bottom": pg.DateAxisItem(utcOffset=0)})
+            self.angle_plot.setLabel("left", "max value phase (0-1)", color="r")
+            self.angle_plot.setXLink(self.p2p_plot)
+            self.wave_plot = pg.PlotWidget()
+            self.wave_plot.setLabel("bottom", "sample")
+            self.wave_plot.setTitle("Click a point to show its rotation")
+            for plot in (self.p2p_plot, self.angle_plot, self.wave_plot):
+                plot.showGrid(x=True, y=True)
+                self.layout.addWidget(plot)
+
+            self.curves = {"p2p": self.p2p_plot.plot(pen=pg.mkPen("b")),
+                           "angle": self.angle_plot.plot(pen=pg.mkPen("r"))}
+            self.markers = {"p2p": self.p2p_plot.plot(symbol="o", symbolBrush="y", pen=None),
+                            "angle": self.angle_plot.plot(symbol="o", symbolBrush="y", pen=None)}
+            self.wave_curve = self.wave_plot.plot(pen=pg.mkPen("g"), symbol="o", symbolSize=4)
+            for plot in (self.p2p_plot, self.angle_plot):
+                plot.getViewBox().setAutoVisible(y=True)
+                plot.scene().sigMouseClicked.connect(lambda event, plot=plot: self.clicked(plot, event))
+
+            # Range changes are coalesced, a drag redraws at most every refresh_ms
+            self.timer = QTimer()
+            self.timer.setSingleShot(True)
+            self.timer.setInterval(refresh_ms)
+            self.timer.timeout.connect(self.refresh)
+            self.p2p_plot.sigXRangeChanged.connect(lambda *_: self.timer.start())
+            self.selected = None
+
+            if cache.rows:
+                self.p2p_plot.setXRange(float(cache.times[0]), float(cache.times[-1]), padding=0.02)
+            self.refresh()
+
+        def refresh(self):
+            if not self.cache.rows:
+                return
+            t0, t1 = self.p2p_plot.getViewBox().viewRange()[0]
+            i0, i1 = self.cache.index_range(t0, t1)
+            max_bins = max(int(self.p2p_plot.getViewBox().width()), 100)
+            for name, curve in self.curves.items():
+                curve.setData(*self.cache.decimate(name, i0, i1, max_bins))
+
+        def clicked(self, plot, event):
+            view = plot.getViewBox()
+            if not view.sceneBoundingRect().contains(event.scenePos()):
+                return
+            point = view.mapSceneToView(event.scenePos())
+            index = self.cache.pick(point.x(), view.viewPixelSize()[0] / 2)
+            if index is not None:
+                self.show_rotation(index)
+
+        def show_rotation(self, index):
+            self.selected = index
+            t = float(self.cache.times[index])
+            for name, marker in self.markers.items():
+                marker.setData([t], [float(self.cache.series[name][index])])
+            self.wave_curve.setData(np.asarray(self.cache.frames[index]))
+            stamp = datetime.fromtimestamp(t, timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+            self.wave_plot.setTitle(f"Rotation {index} at {stamp} UTC, p2p {self.cache.series['p2p'][index]:.0f}, "
+                                    f"phase {self.cache.series['angle'][index]:.3f}")
+
+    return LogViewer()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Interactive viewer of long efmplot CSV logs (plain, .gz, .xz).')
+    parser.add_argument('logs', nargs='+', help='Log files in time order')
+    parser.add_argument('--cache_dir', default=None, help='Directory of the memory-mapped cache (default: FIRST_LOG.cache)')
+    parser.add_argument('--rebuild', action='store_true', help='Parse the logs again even when the cache is up to date')
+    parser.add_argument('--factor', default=FACTOR, type=int, help=f'Rotations per bin between pyramid levels (default: {FACTOR})')
+    parser.add_argument('--build_only', action='store_true', help='Only build the cache, do not open the viewer')
+    args = parser.parse_args()
+
+    cache = LogCache(args.logs, args.cache_dir, args.rebuild, args.factor)
+    if args.build_only:
+        return
+
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication(sys.argv)
+    viewer = make_viewer(cache)
+    viewer.show()
+    sys.exit(app.exec_())
+
+
+if __name__ == "__main__":
+    main()
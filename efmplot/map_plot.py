@@ -1,18 +1,11 @@
+import os
 import numpy as np
 import datetime
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-import pandas as pd
 import argparse
-from pychmirad import ChmiRad
-import io
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-from matplotlib.figure import Figure
-from matplotlib.animation import FFMpegWriter
-from matplotlib.gridspec import GridSpec
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
-from tqdm import tqdm
+from rotating_log import open_log
+
+# matplotlib, cartopy, pychmirad and tqdm are imported inside main() so that
+# --help and argument errors do not pay for them
 
 # Function to clean non-numeric characters from strings
 def clean_data(value):
@@ -22,24 +15,145 @@ def clean_data(value):
         return np.nan  # or you can use a default value like 0
 
 def ptp_orient(array):
-    ret = []
-    for arr in array:
-        min_val = np.min(arr)
-        max_val = np.max(arr)
-        
-        min_idx = np.argmin(arr)
-        max_idx = np.argmax(arr)
-    
-        if min_idx < max_idx:
-            ret.append(max_val - min_val)
-        else:
-            ret.append(min_val - max_val)
-    return ret
+    # Peak-to-peak per row, negative when the minimum comes after the maximum
+    array = np.asarray(array)
+    span = np.max(array, axis=1) - np.min(array, axis=1)
+    return np.where(np.argmin(array, axis=1) < np.argmax(array, axis=1), span, -span)
+
+
+def round_down_to_nearest_five(dt):
+    # Same keys as ChmiRad.data_dict uses
+    return dt.replace(minute=dt.minute - dt.minute % 5, second=0, microsecond=0)
+
+
+def station_distance_order(latitudes, longitudes, shape, center_lat, center_lon, max_radius):
+    """Flat radar grid indices within max_radius km of the station, nearest first.
+
+    Every radius r <= max_radius is then a prefix of the returned index
+    array, so all radii are served by a single gather per radar frame.
+    """
+    lat = np.asarray(latitudes, dtype=np.float64)
+    lon = np.asarray(longitudes, dtype=np.float64)
+    if lat.ndim == 1 and lon.ndim == 1:
+        lon, lat = np.meshgrid(lon, lat)
+    lat = np.broadcast_to(lat, shape)
+    lon = np.broadcast_to(lon, shape)
+    # Haversine distance in km
+    p1, p2 = np.radians(center_lat), np.radians(lat)
+    dlat = p2 - p1
+    dlon = np.radians(lon - center_lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dlon / 2) ** 2
+    dist = 2 * 6371.0 * np.arcsin(np.sqrt(a)).ravel()
+    inside = np.flatnonzero(dist <= max_radius)
+    order = inside[np.argsort(dist[inside], kind='stable')]
+    return order, dist[order]
+
+
+class RadarCache:
+    """Radar frames keyed by 5 minute timestamps, kept as .npy files in a directory.
+
+    Frames missing from the cache are fetched through pychmirad and stored,
+    so later runs over the same period work offline.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.rad_view = None
+        self.grid_path = os.path.join(cache_dir, "grid.npz")
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key.strftime("%Y%m%d_%H%M") + ".npy")
+
+    def _radar(self):
+        if self.rad_view is None:
+            from pychmirad import ChmiRad
+            self.rad_view = ChmiRad()
+        return self.rad_view
+
+    def frame(self, key):
+        path = self._path(key)
+        if os.path.exists(path):
+            return np.load(path)
+        rad_view = self._radar()
+        if key not in rad_view.data_dict:
+            rad_view.download_data(key)
+        data = np.ma.filled(np.ma.asarray(rad_view.data_dict[key], dtype=np.float32), np.nan)
+        np.save(path, data)
+        if not os.path.exists(self.grid_path):
+            np.savez(self.grid_path, latitudes=rad_view.latitudes, longitudes=rad_view.longitudes)
+        return data
+
+    def grid(self):
+        with np.load(self.grid_path) as grid:
+            return grid["latitudes"], grid["longitudes"]
+
+
+def correlate(file_path, center_lat, center_lon, output, cache_dir, radii=(10.0, 25.0, 50.0), threshold=50.0):
+    """Joint time series of EFM features and radar statistics around the station.
+
+    For every rotation: time, signed p2p, signed demodulated amplitude, the
+    radar frame time, and per radius the max, mean and fraction of pixels at
+    or above threshold. Radar statistics are computed once per radar frame.
+    """
+    from demod import demodulate, read_csv_log, signed_amplitude
+
+    times, block, dropped = read_csv_log(file_path)
+    if dropped:
+        print(f"Skipped {dropped} malformed rows")
+    if len(times) == 0:
+        print(f"ERROR: No data in {file_path}")
+        return
+    values = block - 255
+    p2p = ptp_orient(values)
+    amplitude, phase = demodulate(values)
+    field = signed_amplitude(amplitude, phase)
+
+    # Radar frame of every rotation
+    frame_times = np.floor(times / 300) * 300
+    keys, frame_of_row = np.unique(frame_times, return_inverse=True)
+
+    cache = RadarCache(cache_dir)
+    frames = [cache.frame(round_down_to_nearest_five(datetime.datetime.fromtimestamp(k, datetime.timezone.utc).replace(tzinfo=None)))
+              for k in keys]
+    latitudes, longitudes = cache.grid()
+    radii = sorted(radii)
+    order, dist = station_distance_order(latitudes, longitudes, frames[0].shape, center_lat, center_lon, radii[-1])
+    prefix = np.searchsorted(dist, radii, side='right')
+
+    # One gather per frame, then all radii as prefixes of the nearest-first pixels
+    near = np.stack([f.ravel()[order] for f in frames])
+    columns = [times, p2p, field, keys[frame_of_row]]
+    header = ["time", "p2p", "demod_amplitude", "radar_time"]
+    for radius, n in zip(radii, prefix):
+        sub = near[:, :n]
+        valid = np.isfinite(sub)
+        count = np.maximum(valid.sum(axis=1), 1)
+        with np.errstate(invalid='ignore'):
+            vmax = np.where(valid.any(axis=1), np.nanmax(np.where(valid, sub, -np.inf), axis=1), np.nan)
+            vmean = np.where(valid, sub, 0).sum(axis=1) / count
+            frac = (np.where(valid, sub, -np.inf) >= threshold).sum(axis=1) / count
+        columns += [vmax[frame_of_row], vmean[frame_of_row], frac[frame_of_row]]
+        header += [f"max_{radius:g}km", f"mean_{radius:g}km", f"frac_ge{threshold:g}_{radius:g}km"]
+
+    fmt = ['%.3f', '%.6g', '%.6g', '%d'] + ['%.6g'] * (len(columns) - 4)
+    np.savetxt(output, np.column_stack(columns), delimiter=',', header=','.join(header), comments='', fmt=fmt)
+    print(f"Saved {len(times)} rows over {len(keys)} radar frames to {output}")
+
 
 def main(file_path, center_lat, center_lon, save_mp4=False):
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
+    from matplotlib.animation import FFMpegWriter
+    from matplotlib.gridspec import GridSpec
+    import cartopy.crs as ccrs
+    import cartopy.feature as cfeature
+    from pychmirad import ChmiRad
+    from tqdm import tqdm
+
     # Load CSV file
     data = []
-    with open(file_path, 'r') as file:
+    with open_log(file_path) as file:
         for line in file:
             data.append(line.strip().split(','))
 
@@ -181,7 +295,14 @@ if __name__ == "__main__":
     parser.add_argument('lon', type=float, help='Longitude of the center point')
     parser.add_argument('lat', type=float, help='Latitude of the center point')
     parser.add_argument('--mp4', action='store_true', help='Save the animation as MP4')
+    parser.add_argument('--correlate', type=str, metavar='OUTPUT', help='Do not render, write the EFM/radar time series to this CSV file')
+    parser.add_argument('--radii', type=float, nargs='+', default=[10.0, 25.0, 50.0], help='Radii around the station in km (default: 10 25 50)')
+    parser.add_argument('--threshold', type=float, default=50.0, help='Radar value counted as significant reflectivity (default: 50)')
+    parser.add_argument('--radar_cache', type=str, default='radar_cache', help='Directory of cached radar frames (default: radar_cache)')
 
     args = parser.parse_args()
 
-    main(args.file_path, args.lat, args.lon, save_mp4=args.mp4)
+    if args.correlate:
+        correlate(args.file_path, args.lat, args.lon, args.correlate, args.radar_cache, args.radii, args.threshold)
+    else:
+        main(args.file_path, args.lat, args.lon, save_mp4=args.mp4)
@@ -0,0 +1,128 @@
+import os
+import sys
+import time
+from PyQt5.QtCore import QThread, pyqtSignal
+import numpy as np
+from rotating_log import open_log
+from frame_parser import FrameRing
+
+# HDF5 archive files are located and timed by waveform.py of helicolder_python
+WAVEFORM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'helicolder_python')
+
+
+def read_csv_frames(path):
+    # (timestamp, frame) pairs of an efmplot log, streamed line by line
+    with open_log(path) as f:
+        for line in f:
+            fields = line.strip().split(',')
+            if len(fields) < 2:
+                continue
+            try:
+                yield float(fields[0]), [int(x) for x in fields[1:]]
+            except ValueError:
+                continue
+
+
+def read_h5_frames(path, rate, block_rows=4096):
+    import h5py
+    if WAVEFORM_DIR not in sys.path:
+        sys.path.insert(0, WAVEFORM_DIR)
+    from waveform import file_start_time, find_time_dataset, find_waveform_dataset
+    with h5py.File(path, "r") as f:
+        found = find_waveform_dataset(f)
+        if not found:
+            raise ValueError(f"No 2D dataset in {path}")
+        dset = found[1]
+        times = find_time_dataset(f, dset.shape[0])
+        # Without a time dataset rows are timed from the start in the file name
+        file_start = file_start_time(path) or 0.0
+        for start in range(0, dset.shape[0], block_rows):
+            block = dset[start:start + block_rows]
+            if times is not None:
+                block_times = times[start:start + block_rows]
+            else:
+                block_times = file_start + (start + np.arange(len(block))) / rate
+            for t, row in zip(block_times, block):
+                yield float(t), row.tolist()
+
+
+class ReplayReaderThread(QThread):
+    """Drop-in replacement of SerialReaderThread that plays back a recorded file.
+
+    Frames are pushed into the same kind of ring and announced through the
+    same frames_received signal, spaced by their original timestamps divided
+    by speed; speed 0 replays as fast as possible. Nothing is logged, the
+    source already is a log.
+    """
+    frames_received = pyqtSignal(int, int)
+
+    def __init__(self, path, speed=1.0, rate=100.0, ring_size=65536, batch_rows=256, shm_name=None):
+        super().__init__()
+        self.path = path
+        self.speed = speed
+        self.rate = rate
+        self.batch_rows = batch_rows
+        if shm_name:
+            from frame_bus import SharedFrameRing
+            self.ring = SharedFrameRing(shm_name, ring_size)
+        else:
+            self.ring = FrameRing(ring_size)
+        self.malformed = 0
+        self.running = True
+        self.stopped = False
+
+    def frames(self):
+        if self.path.endswith((".h5", ".hdf5")):
+            return read_h5_frames(self.path, self.rate)
+        return read_csv_frames(self.path)
+
+    def _push(self, batch, times):
+        # Every frame keeps its own recorded timestamp
+        if batch:
+            start = self.ring.push(np.array(batch), times)
+            self.frames_received.emit(start, len(batch))
+
+    def run(self):
+        wall_start = time.monotonic()
+        first = None
+        count = 0
+        batch = []
+        batch_times = []
+        for t, frame in self.frames():
+            if not self.running:
+                break
+            if first is None:
+                first = t
+            if self.speed > 0:
+                delay = wall_start + (t - first) / self.speed - time.monotonic()
+                if delay > 0:
+                    # Frames already due go out before waiting for this one
+                    self._push(batch, batch_times)
+                    batch = []
+                    batch_times = []
+                    time.sleep(delay)
+            if self.ring.width is None:
+                self.ring.allocate(len(frame))
+            if len(frame) != self.ring.width:
+                self.malformed += 1
+                continue
+            batch.append(frame)
+            batch_times.append(t)
+            count += 1
+            if len(batch) >= self.batch_rows:
+                self._push(batch, batch_times)
+                batch = []
+                batch_times = []
+        self._push(batch, batch_times)
+        print(f"Replay of {self.path} finished after {count} frames in {time.monotonic() - wall_start:.1f} s")
+
+    def stop(self):
+        # Called from the window's closeEvent and again on aboutToQuit
+        if self.stopped:
+            return
+        self.stopped = True
+        self.running = False
+        if hasattr(self.ring, "close"):
+            self.ring.close()
+        self.quit()
+        self.wait()
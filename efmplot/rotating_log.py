@@ -0,0 +1,136 @@
+import os
+import re
+import glob
+import gzip
+import lzma
+import queue
+import shutil
+import threading
+import time
+
+COMPRESSORS = {
+    "gz": gzip.open,
+    "xz": lzma.open,
+}
+
+# Uncompressed segments left by an earlier run are compressed at start-up
+# and on every hour change, only when nothing has written to them for this
+# many seconds, so the open segment of another running instance is left
+# alone; half-written compressed files (.tmp) of that age are removed
+LEFTOVER_MIN_AGE = 600
+
+
+def open_log(path, mode='rt'):
+    # Opens plain, .gz and .xz logs alike
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    if path.endswith(".xz"):
+        return lzma.open(path, mode)
+    return open(path, mode)
+
+
+class RotatingLog:
+    """Hourly log segments in the YYYY/MM/DD/STATION_YYYYMMDD_HHMMSS.csv layout.
+
+    A segment is closed when the UTC hour changes and handed to a background
+    thread that compresses it, so write() never waits on compression.
+    """
+
+    def __init__(self, log_dir, station, compress="gz", extension="csv"):
+        if compress not in COMPRESSORS and compress != "none":
+            raise ValueError(f"Unknown compression {compress!r}")
+        self.log_dir = log_dir
+        self.station = station
+        self.compress = compress
+        self.extension = extension
+        self.handle = None
+        self.path = None
+        self.hour = None
+
+        self.queue = queue.Queue()
+        self.compressor = threading.Thread(target=self._compress_worker, daemon=True)
+        self.compressor.start()
+        # Segments left uncompressed by a previous run are compressed too
+        self._enqueue_leftovers()
+
+    def _segment_path(self, t):
+        tm = time.gmtime(t)
+        day_dir = os.path.join(self.log_dir, time.strftime("%Y", tm), time.strftime("%m", tm), time.strftime("%d", tm))
+        os.makedirs(day_dir, exist_ok=True)
+        name = f"{self.station}_{time.strftime('%Y%m%d_%H%M%S', tm)}.{self.extension}"
+        return os.path.join(day_dir, name)
+
+    def _open(self, t):
+        self.hour = int(t // 3600)
+        self.path = self._segment_path(t)
+        self.handle = open(self.path, 'a')
+
+    def _close_segment(self):
+        if self.handle is None:
+            return
+        self.handle.close()
+        if self.compress != "none":
+            self.queue.put(self.path)
+        self.handle = None
+
+    def write(self, entry, t=None):
+        if t is None:
+            t = time.time()
+        if self.handle is None or int(t // 3600) != self.hour:
+            if self.handle is not None:
+                self._close_segment()
+                # Catches segments of a restart too recent at start-up
+                self._enqueue_leftovers()
+            # The first segment starts now, later ones on the hour boundary
+            self._open(t if self.hour is None else int(t // 3600) * 3600)
+        self.handle.write(entry)
+
+    def flush(self):
+        if self.handle is not None:
+            self.handle.flush()
+
+    def close(self):
+        self._close_segment()
+        self.queue.put(None)
+        self.compressor.join()
+
+    def _enqueue_leftovers(self):
+        # Only segments of this station in the YYYY/MM/DD layout, never one written to lately
+        if self.compress == "none" or not os.path.isdir(self.log_dir):
+            return
+        now = time.time()
+        compressed = "|".join(re.escape(ext) for ext in COMPRESSORS)
+        segment = re.compile(rf"{re.escape(self.station)}_\d{{8}}_\d{{6}}\.{re.escape(self.extension)}(\.(?:{compressed})\.tmp)?")
+        for day_dir in sorted(glob.glob(os.path.join(glob.escape(self.log_dir), "[0-9]" * 4, "[0-9]" * 2, "[0-9]" * 2))):
+            for name in sorted(os.listdir(day_dir)):
+                match = segment.fullmatch(name)
+                if not match:
+                    continue
+                path = os.path.join(day_dir, name)
+                try:
+                    if now - os.path.getmtime(path) < LEFTOVER_MIN_AGE:
+                        continue
+                    if match.group(1):
+                        # Left by a compressor that died; the segment itself is retried
+                        os.remove(path)
+                        continue
+                except OSError:
+                    continue
+                self.queue.put(path)
+
+    def _compress_worker(self):
+        while True:
+            path = self.queue.get()
+            if path is None:
+                return
+            if not os.path.exists(path):
+                # Queued twice and already compressed
+                continue
+            target = f"{path}.{self.compress}"
+            try:
+                with open(path, 'rb') as src, COMPRESSORS[self.compress](target + ".tmp", 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+                os.replace(target + ".tmp", target)
+                os.remove(path)
+            except Exception as e:
+                print(f"Failed to compress {path}: {e}")
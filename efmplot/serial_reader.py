@@ -0,0 +1,62 @@
+import time
+from PyQt5.QtCore import QThread, pyqtSignal, QIODevice
+from PyQt5.QtSerialPort import QSerialPort
+from rotating_log import RotatingLog
+from frame_parser import FrameParser, FrameRing
+
+
+class SerialReaderThread(QThread):
+    # (first seq, count) of new frames in self.ring
+    frames_received = pyqtSignal(int, int)
+
+    def __init__(self, port_name, baudrate=9600, log_file=None, log_prefix="EFM", log_dir=".", log_compress="gz", ring_size=65536, shm_name=None):
+        super().__init__()
+        if shm_name:
+            # Published for other local processes, see frame_bus.py
+            from frame_bus import SharedFrameRing
+            self.ring = SharedFrameRing(shm_name, ring_size)
+        else:
+            self.ring = FrameRing(ring_size)
+        self.parser = FrameParser(self.ring)
+        self.stopped = False
+        self.port = QSerialPort()
+        self.port.setPortName(port_name)
+        self.port.setBaudRate(baudrate)
+        self.port.readyRead.connect(self.read_data)
+        print("Serial read buffer size:", self.port.readBufferSize())
+        self.log_file = log_file
+        if self.log_file:
+            self.log_file_handle = open(self.log_file, 'a')
+        else:
+            # Hourly segments in the dated archive layout, compressed in the background
+            self.log_file_handle = RotatingLog(log_dir, log_prefix.rstrip("_"), compress=log_compress)
+        if not self.port.open(QIODevice.ReadOnly):
+            print(f"Failed to open port {port_name}")
+
+    def read_data(self):
+        # Everything available is parsed in one go into the ring
+        timestamp = time.time()
+        start, count, lines = self.parser.feed(self.port.readAll().data(), timestamp)
+        if count:
+            self.log_data(lines, timestamp)
+            self.frames_received.emit(start, count)
+
+    def log_data(self, lines, timestamp):
+        prefix = f"{timestamp},".encode()
+        log_entry = b"".join(prefix + line + b"\n" for line in lines).decode()
+        self.log_file_handle.write(log_entry)
+        self.log_file_handle.flush()
+
+    def stop(self):
+        # Called from the window's closeEvent and again on aboutToQuit
+        if self.stopped:
+            return
+        self.stopped = True
+        if self.parser.malformed:
+            print(f"Skipped {self.parser.malformed} malformed lines")
+        self.port.close()
+        self.log_file_handle.close()
+        if hasattr(self.ring, "close"):
+            self.ring.close()
+        self.quit()
+        self.wait()
@@ -0,0 +1,74 @@
+import numpy as np
+from frame_parser import FrameParser, FrameRing
+
+
+def make_parser(width=3):
+    return FrameParser(FrameRing(16, width), synced=True)
+
+
+def frames(parser, start, count):
+    return np.concatenate(parser.ring.views(start, count)).tolist()
+
+
+def test_valid_lines():
+    parser = make_parser()
+    start, count, _ = parser.feed(b'1,2,3\n-4,5,-6\n', 0.0)
+    assert count == 2
+    assert frames(parser, start, count) == [[1, 2, 3], [-4, 5, -6]]
+    assert parser.malformed == 0
+
+
+def test_empty_field_is_malformed():
+    parser = make_parser()
+    start, count, _ = parser.feed(b'1,,3\n4,5,6\n', 0.0)
+    assert frames(parser, start, count) == [[4, 5, 6]]
+    assert parser.malformed == 1
+
+
+def test_embedded_minus_is_malformed():
+    parser = make_parser()
+    start, count, _ = parser.feed(b'1-2,3,4\n4,5,6\n', 0.0)
+    assert frames(parser, start, count) == [[4, 5, 6]]
+    assert parser.malformed == 1
+
+
+def test_lone_minus_is_malformed():
+    parser = make_parser()
+    start, count, _ = parser.feed(b'1,2,-\n4,5,6\n', 0.0)
+    assert frames(parser, start, count) == [[4, 5, 6]]
+    assert parser.malformed == 1
+
+
+def test_partial_first_line_is_dropped():
+    parser = FrameParser(FrameRing(16))
+    row = b','.join(str(i).encode() for i in range(40)) + b'\n'
+    start, count, _ = parser.feed(b'5,36,37,38,39\n' + row * 3, 0.0)
+    assert parser.ring.width == 40
+    assert count == 3
+
+
+def test_read_skips_overwritten_frames():
+    ring = FrameRing(4, 1)
+    for i in range(6):
+        ring.push(np.array([[i]]), float(i))
+    start, data, times = ring.read(0, 6)
+    assert start == 2
+    assert data.ravel().tolist() == [2, 3, 4, 5]
+    assert times.tolist() == [2.0, 3.0, 4.0, 5.0]
+
+
+def test_read_drops_frames_lapped_during_copy():
+    ring = FrameRing(4, 1)
+    ring.push(np.arange(4).reshape(4, 1), 0.0)
+    views = ring.views
+
+    def lapping_views(start, count):
+        # The writer announces two more frames while the copy is made
+        result = views(start, count)
+        ring.writing = ring.seq + 2
+        return result
+
+    ring.views = lapping_views
+    start, data, _ = ring.read(0, 4)
+    assert start == 2
+    assert data.ravel().tolist() == [2, 3]
@@ -0,0 +1,23 @@
+import numpy as np
+from log_viewer import LogCache, parse_batch
+
+
+def test_parse_batch():
+    times, frames = parse_batch(["1.0,1,2,3", "2.0,-4,5,6"], 4)
+    assert times.tolist() == [1.0, 2.0]
+    assert frames.tolist() == [[1, 2, 3], [-4, 5, 6]]
+
+
+def test_parse_batch_drops_empty_field():
+    times, frames = parse_batch(["1.0,1,,3", "2.0,4,5,6", "3.0,x,5,6"], 4)
+    assert times.tolist() == [2.0]
+    assert frames.tolist() == [[4, 5, 6]]
+
+
+def test_cache_counts_damaged_lines(tmp_path):
+    log = tmp_path / "log.csv"
+    log.write_text("1.0,1,2,3\n2.0,1,,3\n3.0,3,2,1\n")
+    cache = LogCache([str(log)], verbose=False)
+    assert cache.rows == 2
+    assert cache.meta["dropped"] == 1
+    assert np.asarray(cache.series["p2p"]).tolist() == [2.0, -2.0]
@@ -0,0 +1,46 @@
+import asyncio
+import websockets
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class WebsocketThread(QThread):
+    message_received = pyqtSignal(str)
+    broadcast_message = pyqtSignal(str)
+
+    def __init__(self, host, port, parent=None):
+        super(WebsocketThread, self).__init__(parent)
+        self.host = host
+        self.port = port
+        self.loop = None
+        self.clients = set()
+        self.running = True
+        self.broadcast_message.connect(self.handle_broadcast_message)
+
+    async def handler(self, websocket, path=None):
+        self.clients.add(websocket)
+        try:
+            async for message in websocket:
+                print(f"Received: {message}")
+                #self.message_received.emit(f"Received: {message}")
+        finally:
+            self.clients.remove(websocket)
+    
+    def handle_broadcast_message(self, message):
+        asyncio.run_coroutine_threadsafe(self.send_message_to_all(message), self.loop)
+
+    async def send_message_to_all(self, message):
+        if self.clients:
+            await asyncio.gather(*(client.send(message) for client in self.clients))
+
+    async def run_server(self):
+        async with websockets.serve(self.handler, self.host, self.port):
+            await asyncio.Future()
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.run_server())
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.running = False
@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+# Helicorder run time against archive size: for every files x rate
+# combination a synthetic day is generated, plot.py runs on it with
+# --profile and the stage times are collected. The run fails when a
+# combination exceeds the budget (RuntimeMaxSec of efm-plot.service).
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATE = "20240710"
+
+
+def run_case(workdir, files, rate, columns, extra_args):
+    archive = os.path.join(workdir, f"archive_{files}_{rate:g}")
+    output = os.path.join(workdir, f"output_{files}_{rate:g}")
+    profile = os.path.join(workdir, f"profile_{files}_{rate:g}.json")
+    subprocess.run([sys.executable, os.path.join(HERE, "synth_archive.py"), "--output", archive, "--date", DATE,
+                    "--files", str(files), "--rate", str(rate), "--columns", str(columns)],
+                   check=True, capture_output=True)
+    proc = subprocess.run([sys.executable, os.path.join(HERE, "plot.py"), "--input", archive, "--output", output,
+                           "--date", DATE, "--profile", profile] + extra_args,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "plot.py failed")
+    with open(profile) as f:
+        report = json.load(f)
+    shutil.rmtree(archive, ignore_errors=True)
+    shutil.rmtree(output, ignore_errors=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Helicorder run time against the number of files and the sample rate.')
+    parser.add_argument('--files', type=int, nargs='+', default=[24, 48, 96], help='Files per day to try (default: 24 48 96)')
+    parser.add_argument('--rate', type=float, nargs='+', default=[10, 50], help='Rotations per second to try (default: 10 50)')
+    parser.add_argument('--columns', type=int, default=40, help='Samples per rotation (default: 40)')
+    parser.add_argument('--budget', type=float, default=300.0, help='Maximum wall time of one run in seconds (default: 300)')
+    parser.add_argument('--workdir', type=str, help='Directory for the generated archives (default: a temporary directory)')
+    parser.add_argument('--json', type=str, help='Write results to this JSON file')
+    parser.add_argument('plot_args', nargs=argparse.REMAINDER, help='Extra plot.py arguments after --')
+    args = parser.parse_args()
+    extra_args = [a for a in args.plot_args if a != '--']
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_helicorder_")
+    os.makedirs(workdir, exist_ok=True)
+
+    results = []
+    failed = False
+    stage_names = ["glob", "read", "concatenate", "pyramid", "grid", "plot", "savefig"]
+    print(f"{'files':>6} {'rate':>6} {'samples':>10} " + " ".join(f"{s:>11}" for s in stage_names) + f" {'total s':>8} {'peak MB':>8}")
+    for rate in args.rate:
+        for files in args.files:
+            try:
+                report = run_case(workdir, files, rate, args.columns, extra_args)
+            except Exception as e:
+                print(f"{files:>6} {rate:>6g} FAILED: {e}")
+                failed = True
+                continue
+            stages = report["stages"]
+            walls = [stages.get(s, {}).get("wall", 0.0) for s in stage_names]
+            over = report["wall"] > args.budget
+            failed = failed or over
+            print(f"{files:>6} {rate:>6g} {report['counters'].get('samples', 0):>10} "
+                  + " ".join(f"{w:>11.3f}" for w in walls)
+                  + f" {report['wall']:>8.2f} {report['peak_rss_mb']:>8.1f}" + ("  OVER BUDGET" if over else ""))
+            results.append({"files": files, "rate": rate, "columns": args.columns, "wall": report["wall"],
+                            "peak_rss_mb": report["peak_rss_mb"], "samples": report["counters"].get("samples", 0),
+                            "stages": stages})
+
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"budget": args.budget, "results": results}, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import os
+import sqlite3
+import argparse
+import h5py
+import numpy as np
+from datetime import datetime, timezone
+from waveform import estimate_rate, file_start_time, find_time_dataset, find_waveform_dataset, split_file_name
+
+# SQLite catalog of the waveform archive. Every .h5 file is opened once to
+# record its dataset, shape and time range; later updates only stat the
+# files and reopen the new or changed ones. Window queries, coverage and gap
+# reports are answered from the catalog alone.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    station TEXT NOT NULL,
+    start REAL,
+    end REAL,
+    rows INTEGER NOT NULL,
+    columns INTEGER NOT NULL,
+    dataset TEXT,
+    time_dataset TEXT,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_station_start ON files (station, start);
+"""
+
+FIELDS = ("path", "station", "start", "end", "rows", "columns", "dataset", "time_dataset", "mtime", "size")
+
+
+def open_catalog(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    # Readers (serve.py, plot.py runs) are not blocked by an update
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def station_of(path):
+    # STATION_YYYYMMDD_HHMMSS.h5 or STATION_YYYYMMDD_HH*.h5
+    return split_file_name(path)[0]
+
+
+def scan_file(path, stat):
+    """Catalog record of one file; start/end come from the time dataset when there is one."""
+    record = dict(path=path, station=station_of(path), start=file_start_time(path), end=None, rows=0, columns=0,
+                  dataset=None, time_dataset=None, mtime=stat.st_mtime, size=stat.st_size)
+    with h5py.File(path, "r") as f:
+        found = find_waveform_dataset(f)
+        if not found:
+            return record
+        dset = found[1]
+        record.update(dataset=dset.name, rows=dset.shape[0], columns=dset.shape[1])
+        time_dset = find_time_dataset(f, dset.shape[0]) if dset.shape[0] else None
+        if time_dset is not None:
+            first, last = time_dset[0], time_dset[-1]
+            step = (last - first) / max(dset.shape[0] - 1, 1)
+            record.update(time_dataset=time_dset.name, start=float(first), end=float(last + step))
+    return record
+
+
+def walk_h5(root):
+    stack = [root]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.name.endswith(".h5"):
+                yield entry
+
+
+def update_catalog(conn, root, subdirs=None, verbose=False):
+    """Bring the catalog up to date with root (or only with the given subdirectories of it).
+
+    Returns (added or changed, removed) file counts.
+    """
+    dirs = [os.path.join(root, d) for d in subdirs] if subdirs else [root]
+    known = {}
+    for d in dirs:
+        prefix = os.path.join(os.path.abspath(d), "")
+        for row in conn.execute("SELECT path, mtime, size FROM files WHERE path LIKE ? ESCAPE '\\'",
+                                (prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%",)):
+            known[row["path"]] = (row["mtime"], row["size"])
+
+    changed = []
+    seen = set()
+    for d in dirs:
+        for entry in walk_h5(os.path.abspath(d)):
+            stat = entry.stat()
+            seen.add(entry.path)
+            if known.get(entry.path) == (stat.st_mtime, stat.st_size):
+                continue
+            try:
+                changed.append(scan_file(entry.path, stat))
+            except Exception as e:
+                print(f"Error cataloguing {entry.path}: {str(e)}")
+                continue
+            if verbose:
+                print(f"  - Catalogued {entry.path}")
+
+    removed = [path for path in known if path not in seen]
+    with conn:
+        conn.executemany(f"INSERT OR REPLACE INTO files ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})",
+                         [tuple(r[k] for k in FIELDS) for r in changed])
+        conn.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in removed])
+        # Files without a time dataset end where their rows run out at the
+        # rate of their day, recomputed for every day that changed
+        days = {(r["station"], day_key(r["start"])) for r in changed if r["time_dataset"] is None and r["start"] is not None}
+        for station, day in days:
+            update_day_ends(conn, station, day)
+    return len(changed), len(removed)
+
+
+def day_key(t):
+    return datetime.fromtimestamp(t, timezone.utc).strftime("%Y%m%d")
+
+
+def update_day_ends(conn, station, day):
+    day_start = datetime.strptime(day, "%Y%m%d").replace(tzinfo=timezone.utc).timestamp()
+    rows = conn.execute("SELECT path, start, rows FROM files WHERE station = ? AND time_dataset IS NULL "
+                        "AND start >= ? AND start < ? ORDER BY start", (station, day_start, day_start + 86400)).fetchall()
+    rate = estimate_rate([r["start"] for r in rows], [r["rows"] for r in rows])
+    conn.executemany("UPDATE files SET end = ? WHERE path = ?", [(r["start"] + r["rows"] / rate, r["path"]) for r in rows])
+
+
+def files_in_window(conn, station, start, end):
+    """Catalog rows of the files with data inside [start, end), in time order."""
+    return conn.execute("SELECT * FROM files WHERE station = ? AND start < ? AND end > ? AND rows > 0 ORDER BY start",
+                        (station, end, start)).fetchall()
+
+
+def coverage(conn, station, start, end, min_gap=1.0):
+    """(covered seconds, gaps) of [start, end); gaps shorter than min_gap are ignored."""
+    covered = 0.0
+    gaps = []
+    cursor = start
+    for row in files_in_window(conn, station, start, end):
+        s, e = max(row["start"], start), min(row["end"], end)
+        if s - cursor >= min_gap:
+            gaps.append((cursor, s))
+        if e > cursor:
+            covered += e - max(s, cursor)
+            cursor = e
+    if end - cursor >= min_gap:
+        gaps.append((cursor, end))
+    return covered, gaps
+
+
+def stations(conn):
+    return [row[0] for row in conn.execute("SELECT DISTINCT station FROM files ORDER BY station")]
+
+
+def parse_day(text):
+    return datetime.strptime(text, "%Y%m%d").replace(tzinfo=timezone.utc).timestamp()
+
+
+def format_time(t):
+    return datetime.fromtimestamp(t, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite catalog of the EFM waveform archive with coverage and gap reports.')
+    parser.add_argument('--input', type=str, required=True, help='Root directory containing waveform data')
+    parser.add_argument('--catalog', type=str, required=True, help='SQLite catalog file, created when missing')
+    parser.add_argument('--no-update', action='store_true', help='Report from the catalog as it is, without scanning the archive')
+    parser.add_argument('--report', type=str, choices=['none', 'files', 'coverage', 'gaps'], default='coverage', help='What to print (default: coverage)')
+    parser.add_argument('--station', type=str, action='append', help='Stations to report, repeatable (default: all in the catalog)')
+    parser.add_argument('--start', type=str, help='First day of the report in YYYYMMDD format (default: first catalogued day)')
+    parser.add_argument('--end', type=str, help='Last day of the report in YYYYMMDD format (default: last catalogued day)')
+    parser.add_argument('--min-gap', type=float, default=1.0, help='Shortest gap reported in seconds (default: 1)')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose output')
+    args = parser.parse_args()
+
+    conn = open_catalog(args.catalog)
+    if not args.no_update:
+        changed, removed = update_catalog(conn, args.input, verbose=args.verbose)
+        print(f"Catalog updated: {changed} files added or changed, {removed} removed")
+    if args.report == 'none':
+        return
+
+    for station in args.station or stations(conn):
+        first, last = conn.execute("SELECT MIN(start), MAX(end) FROM files WHERE station = ? AND rows > 0", (station,)).fetchone()
+        if first is None:
+            print(f"{station}: no data in the catalog")
+            continue
+        start = parse_day(args.start) if args.start else parse_day(day_key(first))
+        # A file ending exactly at midnight does not open another day
+        end = parse_day(args.end) + 86400 if args.end else parse_day(day_key(last - 1e-3)) + 86400
+        if args.report == 'files':
+            for row in files_in_window(conn, station, start, end):
+                print(f"{row['path']}  {format_time(row['start'])} - {format_time(row['end'])}  {row['rows']}x{row['columns']} {row['dataset']}")
+        elif args.report == 'gaps':
+            _, gaps = coverage(conn, station, start, end, args.min_gap)
+            for s, e in gaps:
+                print(f"{station}  {format_time(s)} - {format_time(e)}  {e - s:10.1f} s")
+        else:
+            print(f"{station}:")
+            for day_start in np.arange(start, end, 86400):
+                covered, gaps = coverage(conn, station, day_start, day_start + 86400, args.min_gap)
+                n_files, n_rows = conn.execute("SELECT COUNT(*), COALESCE(SUM(rows), 0) FROM files WHERE station = ? AND start >= ? AND start < ?",
+                                               (station, day_start, day_start + 86400)).fetchone()
+                print(f"  {day_key(day_start)}  {100 * covered / 86400:6.2f} %  {n_files:4d} files  {n_rows:10d} rows  {len(gaps):3d} gaps")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import argparse
+import h5py
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from waveform import block_rows, estimate_rate, file_start_time, find_time_dataset, find_waveform_dataset, split_file_name
+from catalog import day_key, walk_h5
+
+# demodulate() lives with the acquisition code in ../efmplot
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'efmplot'))
+from demod import demodulate
+
+# Feature store of the waveform archive: one HDF5 file per station and day,
+# OUTPUT/YYYY/MM/STATION_FEATURES_YYYYMMDD.h5, with a "rotation" group (one
+# dataset per feature, one row per rotation) and a "minute" group of per-minute
+# statistics. Days are processed in parallel; a day is skipped when its store
+# was written from the same source files (path, mtime, size) and settings, and
+# a store appears only once complete, so an interrupted run resumes where it
+# stopped.
+
+STORE_VERSION = 1
+
+# Per-rotation datasets and their types
+ROTATION_FEATURES = {
+    "time": np.float64,         # epoch seconds (UTC)
+    "efi": np.int32,            # channel A - channel B, as plot.py
+    "p2p": np.int32,            # peak-to-peak, negative when the minimum comes after the maximum
+    "phase": np.float32,        # position of the maximum in the rotation, 0-1
+    "amplitude": np.float32,    # demodulated amplitude of the fundamental (demod.py)
+    "demod_phase": np.float32,  # its phase in radians
+}
+
+# Per-minute statistics (min, max, mean, std) of these rotation features
+MINUTE_FEATURES = ("efi", "p2p", "amplitude")
+
+
+def store_path(output_dir, station_prefix, day_prefix):
+    return os.path.join(output_dir, day_prefix[:4], day_prefix[4:6], f"{station_prefix}_FEATURES_{day_prefix}.h5")
+
+
+def rotation_features(block, channels):
+    """Feature columns of a (rotations, samples) block."""
+    block = np.asarray(block)
+    argmax = block.argmax(axis=1)
+    span = block.max(axis=1).astype(np.int64) - block.min(axis=1)
+    amplitude, demod_phase = demodulate(block)
+    return {
+        "efi": block[:, channels[0]].astype(np.int64) - block[:, channels[1]],
+        "p2p": np.where(block.argmin(axis=1) < argmax, span, -span),
+        "phase": argmax / block.shape[1],
+        "amplitude": amplitude,
+        "demod_phase": demod_phase,
+    }
+
+
+def minute_features(times, features):
+    """Per-minute count, min, max, mean and std of MINUTE_FEATURES; times must be sorted."""
+    minutes = np.floor(times / 60).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, minutes[1:] != minutes[:-1]]) if len(minutes) else np.empty(0, dtype=np.int64)
+    count = np.diff(np.r_[starts, len(minutes)])
+    out = {"time": minutes[starts] * 60.0, "count": count, "offset": starts}
+    for name in MINUTE_FEATURES:
+        values = np.asarray(features[name], dtype=np.float64)
+        if not len(starts):
+            for stat in ("min", "max", "mean", "std"):
+                out[f"{name}_{stat}"] = np.empty(0)
+            continue
+        mean = np.add.reduceat(values, starts) / count
+        square = np.add.reduceat(values * values, starts) / count
+        out[f"{name}_min"] = np.minimum.reduceat(values, starts)
+        out[f"{name}_max"] = np.maximum.reduceat(values, starts)
+        out[f"{name}_mean"] = mean
+        out[f"{name}_std"] = np.sqrt(np.maximum(square - mean * mean, 0))
+    return out
+
+
+def day_sources(files):
+    return [[path, os.path.getmtime(path), os.path.getsize(path)] for path in files]
+
+
+def is_done(path, sources, settings):
+    # Written by an earlier run from the same files with the same settings
+    try:
+        with h5py.File(path, "r") as f:
+            return (f.attrs.get("version") == STORE_VERSION and json.loads(f.attrs["sources"]) == sources
+                    and json.loads(f.attrs["settings"]) == settings)
+    except (OSError, KeyError, ValueError):
+        return False
+
+
+def extract_day(station_prefix, day_prefix, files, output_dir, channels, rate=None, force=False, verbose=False):
+    """Compute and store the features of one station's day; returns (status, rotations, seconds)."""
+    started = time.perf_counter()
+    path = store_path(output_dir, station_prefix, day_prefix)
+    sources = day_sources(files)
+    settings = {"channels": list(channels), "rate": rate}
+    if not force and is_done(path, sources, settings):
+        return "skipped", 0, time.perf_counter() - started
+
+    parts = []
+    for file_path in files:
+        start = file_start_time(file_path)
+        try:
+            with h5py.File(file_path, "r") as f:
+                found = find_waveform_dataset(f)
+                if not found or found[1].shape[0] == 0:
+                    continue
+                dset = found[1]
+                time_dset = find_time_dataset(f, dset.shape[0])
+                row_times = time_dset[()].astype(np.float64) if time_dset is not None else None
+                if start is None and row_times is None:
+                    print(f"Skipping {file_path}: no time dataset and no YYYYMMDD_HH[MMSS] start time in the name")
+                    continue
+                # Whole rotations are needed, read in chunk-aligned row blocks
+                step = block_rows(dset)
+                blocks = [rotation_features(dset[i:i + step], channels) for i in range(0, dset.shape[0], step)]
+        except Exception as e:
+            print(f"Error processing file {file_path}: {str(e)}")
+            continue
+        features = {name: np.concatenate([b[name] for b in blocks]) for name in blocks[0]}
+        parts.append((start if start is not None else row_times[0], features, row_times))
+        if verbose:
+            print(f"  - {os.path.basename(file_path)}: {dset.shape[0]} rotations")
+
+    parts.sort(key=lambda part: part[0])
+    file_rate = rate or estimate_rate([p[0] for p in parts], [len(p[1]["efi"]) for p in parts])
+    rotation = {"time": np.concatenate([p[2] if p[2] is not None else p[0] + np.arange(len(p[1]["efi"])) / file_rate
+                                        for p in parts]) if parts else np.empty(0)}
+    for name in ROTATION_FEATURES:
+        if name != "time":
+            rotation[name] = np.concatenate([p[1][name] for p in parts]) if parts else np.empty(0)
+    if np.any(np.diff(rotation["time"]) < 0):
+        order = np.argsort(rotation["time"], kind="stable")
+        rotation = {name: values[order] for name, values in rotation.items()}
+    minute = minute_features(rotation["time"], rotation)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with h5py.File(tmp_path, "w") as f:
+        f.attrs["version"] = STORE_VERSION
+        f.attrs["station"] = station_prefix
+        f.attrs["day"] = day_prefix
+        f.attrs["rate"] = file_rate
+        f.attrs["sources"] = json.dumps(sources)
+        f.attrs["settings"] = json.dumps(settings)
+        grp = f.create_group("rotation")
+        opts = dict(compression="gzip", shuffle=True, chunks=(min(65536, len(rotation["time"])),)) if len(rotation["time"]) > 1024 else {}
+        for name, dtype in ROTATION_FEATURES.items():
+            grp.create_dataset(name, data=rotation[name].astype(dtype), **opts)
+        grp = f.create_group("minute")
+        opts = dict(compression="gzip", shuffle=True) if len(minute["time"]) > 1024 else {}
+        for name, values in minute.items():
+            dtype = np.float64 if name == "time" else np.int64 if name in ("count", "offset") else np.float32
+            grp.create_dataset(name, data=values.astype(dtype), **opts)
+    os.replace(tmp_path, path)
+    return "done", len(rotation["time"]), time.perf_counter() - started
+
+
+def find_days(input_dir, stations=None, start=None, end=None):
+    """{(station, YYYYMMDD): files} of the archive, YYYY/MM/DD/STATION_YYYYMMDD_HHMMSS.h5 (or _HH*.h5)."""
+    days = {}
+    for entry in walk_h5(input_dir):
+        station, file_start = split_file_name(entry.path)
+        if file_start is None:
+            print(f"Skipping {entry.path}: no YYYYMMDD_HH[MMSS] start time in the name")
+            continue
+        day_prefix = day_key(file_start)
+        if stations and station not in stations:
+            continue
+        if (start and day_prefix < start) or (end and day_prefix > end):
+            continue
+        days.setdefault((station, day_prefix), []).append(entry.path)
+    return {key: sorted(files) for key, files in sorted(days.items())}
+
+
+def read_features(output_dir, station_prefix, start, end, level="rotation", names=None):
+    """Concatenated feature columns of [start, end) epoch seconds from the day stores.
+
+    level is "rotation" or "minute"; names limits the columns read (time is
+    always included). Only the rows of the window are read from each day.
+    """
+    out = {}
+    day = datetime.fromtimestamp(start, timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    # A day's files may run a little past midnight into the next day
+    day -= 86400
+    while day < end:
+        path = store_path(output_dir, station_prefix, datetime.fromtimestamp(day, timezone.utc).strftime("%Y%m%d"))
+        day += 86400
+        if not os.path.exists(path):
+            continue
+        with h5py.File(path, "r") as f:
+            grp = f[level]
+            times = grp["time"][()]
+            i0, i1 = np.searchsorted(times, start), np.searchsorted(times, end)
+            if i0 == i1:
+                continue
+            for name in ["time"] + [n for n in (names or grp.keys()) if n != "time"]:
+                out.setdefault(name, []).append(times[i0:i1] if name == "time" else grp[name][i0:i1])
+    return {name: np.concatenate(parts) for name, parts in out.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract per-rotation and per-minute features of the waveform archive into a per-day feature store.')
+    parser.add_argument('--input', type=str, required=True, help='Root directory containing waveform data')
+    parser.add_argument('--output', type=str, required=True, help='Root directory of the feature store')
+    parser.add_argument('--station', type=str, action='append', help='Station prefix, repeatable (default: all stations in the archive)')
+    parser.add_argument('--start', type=str, help='First day in YYYYMMDD format (default: first day of the archive)')
+    parser.add_argument('--end', type=str, help='Last day in YYYYMMDD format (default: last day of the archive)')
+    parser.add_argument('--channels', type=int, nargs=2, default=[13, 33], metavar=('A', 'B'), help='Waveform columns whose difference A - B is the EFI (default: 13 33)')
+    parser.add_argument('--rate', type=float, default=None, help='Rows per second of files without a time dataset (default: estimated per day from the file start times)')
+    parser.add_argument('--workers', type=int, default=None, help='Parallel worker processes (default: number of CPUs)')
+    parser.add_argument('--force', action='store_true', help='Recompute days whose store is up to date')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose output')
+    args = parser.parse_args()
+
+    days = find_days(args.input, args.station, args.start, args.end)
+    print(f"Found {len(days)} station days under {args.input}")
+    counts = {"done": 0, "skipped": 0, "failed": 0}
+    rotations = 0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(extract_day, station, day_prefix, files, args.output, args.channels, args.rate,
+                               args.force, args.verbose): (station, day_prefix)
+                   for (station, day_prefix), files in days.items()}
+        for future in as_completed(futures):
+            station, day_prefix = futures[future]
+            try:
+                status, n, seconds = future.result()
+            except Exception as e:
+                print(f"{station} {day_prefix}: failed: {e}")
+                counts["failed"] += 1
+                continue
+            counts[status] += 1
+            rotations += n
+            if status == "done" or args.verbose:
+                print(f"{station} {day_prefix}: {status}, {n} rotations in {seconds:.1f} s")
+    print(f"{counts['done']} days extracted ({rotations} rotations), {counts['skipped']} up to date, "
+          f"{counts['failed']} failed in {time.perf_counter() - started:.1f} s")
+    sys.exit(1 if counts["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
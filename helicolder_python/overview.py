@@ -0,0 +1,122 @@
+import os
+import calendar
+import numpy as np
+from datetime import datetime, timezone
+from pyramid import DAY_SECONDS, pyramid_path, read_minutes
+
+# Month and year overviews are drawn from the 1 min level of the day
+# pyramids only, raw waveform files are never opened.
+
+MINUTES = DAY_SECONDS // 60
+
+
+def period_days(period, year, month):
+    # UTC dates covered by a month or a year
+    months = [month] if period == 'month' else range(1, 13)
+    return [datetime(year, m, d, tzinfo=timezone.utc)
+            for m in months for d in range(1, calendar.monthrange(year, m)[1] + 1)]
+
+
+def load_period(processing_dir, station_prefix, days, verbose=False):
+    """Per-minute (min, max, mean) matrices with one row per day.
+
+    Days without a pyramid stay NaN and are listed in the returned missing list.
+    """
+    shape = (len(days), MINUTES)
+    vmin = np.full(shape, np.nan)
+    vmax = np.full(shape, np.nan)
+    vmean = np.full(shape, np.nan)
+    missing = []
+    for i, day in enumerate(days):
+        path = pyramid_path(os.path.join(processing_dir, day.strftime("%Y_%m")), station_prefix, day.strftime("%Y%m%d"))
+        if not os.path.exists(path):
+            missing.append(day)
+            continue
+        try:
+            vmin[i], vmax[i], vmean[i], _ = read_minutes(path)
+        except Exception as e:
+            print(f"Error reading pyramid {path}: {str(e)}")
+            missing.append(day)
+            continue
+        if verbose:
+            print(f"  - Loaded minute aggregates from {os.path.basename(path)}")
+    return vmin, vmax, vmean, missing
+
+
+def _style(ax, colors):
+    ax.set_facecolor(colors['bg_color'])
+    ax.tick_params(colors=colors['text_color'])
+    for spine in ax.spines.values():
+        spine.set_edgecolor(colors['text_color'])
+
+
+def draw_month(ax, days, vmin, vmax, vmean, colors, amplitude_scale, title):
+    # One helicorder row per day: minute min/max band and the minute mean
+    text_color = colors['text_color']
+    _style(ax, colors)
+    amp_offset = 15000
+    hours = np.arange(MINUTES) / 60 + 0.5 / 60
+    for i in range(len(days)):
+        base_y = (len(days) - 1 - i) * amp_offset
+        ax.plot([0, 24], [base_y, base_y], color=colors['grid_color'], linewidth=0.4, linestyle="dashed")
+        if np.isnan(vmean[i]).all():
+            continue
+        color = colors['line_color1'] if i % 2 == 0 else colors['line_color2']
+        ax.fill_between(hours, vmin[i] * amplitude_scale + base_y, vmax[i] * amplitude_scale + base_y,
+                        color=color, alpha=0.3, linewidth=0)
+        ax.plot(hours, vmean[i] * amplitude_scale + base_y, color=color, linewidth=0.6)
+
+    ax.set_xlim(0, 24)
+    ax.set_ylim(-amp_offset * 1.5, amp_offset * (len(days) + 0.5))
+    ax.set_xticks(range(0, 25, 3))
+    ax.set_yticks([(len(days) - 1 - i) * amp_offset for i in range(len(days))])
+    ax.set_yticklabels([day.strftime("%d") for day in days])
+    ax.set_xlabel("UTC hour", color=text_color)
+    ax.set_ylabel("Day", color=text_color)
+    ax.set_title(title, color=text_color)
+
+
+def draw_year(ax_image, ax_daily, days, vmin, vmax, vmean, colors, calibration_coefficient, title, columns=144):
+    """Day x time-of-day image of the mean field and a daily min/max/mean band below it."""
+    text_color = colors['text_color']
+    _style(ax_image, colors)
+    _style(ax_daily, colors)
+
+    kvm = vmean / calibration_coefficient
+    # Minutes folded into columns of the image, NaN where a column has no data
+    folded = kvm.reshape(len(days), columns, -1)
+    valid = np.isfinite(folded)
+    counts = valid.sum(axis=2)
+    image = np.where(counts > 0, np.where(valid, folded, 0).sum(axis=2) / np.maximum(counts, 1), np.nan)
+
+    limit = np.nanpercentile(np.abs(image), 99) if np.isfinite(image).any() else 1.0
+    im = ax_image.imshow(image.T, aspect='auto', origin='lower', cmap='RdBu_r', vmin=-limit, vmax=limit,
+                         extent=(0, len(days), 0, 24), interpolation='nearest')
+    # Colorbar in an inset, so the image keeps the width of the daily axes below
+    cbar = ax_image.figure.colorbar(im, cax=ax_image.inset_axes([1.01, 0, 0.012, 1]))
+    cbar.set_label("Mean EFI (kV/m)", color=text_color)
+    cbar.ax.tick_params(colors=text_color)
+    ax_image.set_yticks(range(0, 25, 6))
+    ax_image.set_ylabel("UTC hour", color=text_color)
+    ax_image.set_title(title, color=text_color)
+
+    x = np.arange(len(days)) + 0.5
+    day_min = np.where(np.isnan(vmin), np.inf, vmin).min(axis=1)
+    day_max = np.where(np.isnan(vmax), -np.inf, vmax).max(axis=1)
+    empty = np.isnan(vmean).all(axis=1)
+    day_min[empty] = np.nan
+    day_max[empty] = np.nan
+    day_mean = np.full(len(days), np.nan)
+    day_mean[~empty] = np.nanmean(vmean[~empty], axis=1)
+    ax_daily.bar(x, (day_max - day_min) / calibration_coefficient, bottom=day_min / calibration_coefficient,
+                 width=1.0, color=colors['line_color1'], alpha=0.3, linewidth=0)
+    ax_daily.plot(x, day_mean / calibration_coefficient, color=colors['line_color1'], linewidth=0.8, marker='.', markersize=3)
+    ax_daily.axhline(0, color=colors['grid_color'], linewidth=0.4, linestyle="dashed")
+    ax_daily.set_xlim(0, len(days))
+    ax_daily.set_ylabel("Daily EFI (kV/m)", color=text_color)
+
+    # Month starts as ticks
+    starts = [i for i, day in enumerate(days) if day.day == 1]
+    for ax in (ax_image, ax_daily):
+        ax.set_xticks(starts)
+        ax.set_xticklabels([days[i].strftime("%b") for i in starts])
@@ -4,43 +4,284 @@ import h5py
 import numpy as np
 import matplotlib.pyplot as plt
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
+from waveform import estimate_rate, file_start_time, find_time_dataset, find_waveform_dataset, read_channel_difference
+from pyramid import DEFAULT_LEVELS, build_pyramid, day_grid, pyramid_path, write_pyramid
+from overview import period_days, load_period, draw_month, draw_year
+from profiling import StageProfiler, print_summary
+from catalog import files_in_window, open_catalog, update_catalog
+
+HOURS = [f"{int(h):02d}" for h in range(24)]
+
+# Time bin of the helicorder rows, must divide an hour
+DEFAULT_BIN_SECONDS = 1.0
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Generate EFI helicorder plots for THUNDERMILL data.')
     parser.add_argument('--input', type=str, required=True, help='Root directory containing waveform data')
     parser.add_argument('--output', type=str, required=True, help='Root directory for output files')
-    parser.add_argument('--date', type=str, help='Date to plot in YYYYMMDD format (default: yesterday or today based on current time)')
+    parser.add_argument('--date', type=str, help='Date to plot in YYYYMMDD format, YYYYMM or YYYY is enough for --period month/year (default: yesterday or today based on current time)')
+    parser.add_argument('--period', type=str, choices=['day', 'month', 'year'], default='day', help='Daily helicorder, or a month/year overview built from the stored day pyramids only (default: day)')
     parser.add_argument('--observatory', type=str, default='Musala', help='Name of the observatory (default: Musala)')
-    parser.add_argument('--station', type=str, default='THUNDERMILL01', help='Station prefix (default: THUNDERMILL01)')
+    parser.add_argument('--station', type=str, action='append', help='Station prefix, repeat for several stations and a composite plot (default: THUNDERMILL01)')
     parser.add_argument('--format', type=str, choices=['png', 'svg'], default='png', help='Output format (png or svg, default: png)')
     parser.add_argument('--theme', type=str, choices=['light', 'dark'], default='light', help='Plot theme (light or dark, default: light)')
     parser.add_argument('--calibration', type=float, default=1/1.4244*1000, help='Calibration coefficient for ADU to kV/m conversion (default: 701.98)')
     parser.add_argument('--scale', type=float, default=4.0, help='Amplitude scaling factor for visualization (default: 4.0)')
+    parser.add_argument('--channels', type=int, nargs=2, default=[13, 33], metavar=('A', 'B'), help='Waveform columns whose difference A - B is plotted (default: 13 33)')
+    parser.add_argument('--rate', type=float, default=None, help='Rows per second of files without a time dataset (default: estimated from the file start times)')
+    parser.add_argument('--bin-seconds', type=float, default=DEFAULT_BIN_SECONDS, help='Time bin of the helicorder rows, each bin is drawn as its min and max (default: 1)')
+    parser.add_argument('--catalog', type=str, default=None, metavar='FILE', help='Find the files through this SQLite archive catalog (see catalog.py), updated for the plotted day, instead of globbing')
+    parser.add_argument('--workers', type=int, default=None, help='Parallel loader processes when plotting several stations (default: one per station)')
+    parser.add_argument('--no-pyramid', action='store_true', help='Do not write the multi-resolution min/max/mean pyramid file (the day is then missing from overviews)')
+    parser.add_argument('--profile', type=str, nargs='?', const='', default=None, metavar='FILE', help='Write wall time, CPU time and peak RSS of every stage as JSON (default file: PROFILE_YYYYMMDD.json in the output month directory)')
     parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose output')
-    
-    return parser.parse_args()
-
-def find_2d_dataset(h5obj):
-    for name, item in h5obj.items():
-        if isinstance(item, h5py.Dataset) and item.ndim == 2:
-            return name, item
-        elif isinstance(item, h5py.Group):
-            found = find_2d_dataset(item)
-            if found:
-                return found
-    return None
+
+    args = parser.parse_args()
+    if not args.station:
+        args.station = ['THUNDERMILL01']
+    if args.bin_seconds <= 0 or abs(3600 / args.bin_seconds - round(3600 / args.bin_seconds)) > 1e-9:
+        parser.error('--bin-seconds must divide an hour')
+    return args
+
+def day_files(date_path, station_prefix, day_prefix):
+    pattern = os.path.join(date_path, f"{station_prefix}_{day_prefix}_*.h5")
+    return pattern, sorted(glob.glob(pattern))
+
+def load_day(date_path, station_prefix, day_prefix, channels, verbose, profiler=None, rate=None, files=None):
+    """Sample times (epoch seconds) and EFI values of one station's day, in time order.
+
+    Rows are timed by a time dataset when the file has one, otherwise by the
+    start time in the file name and the rate (estimated from the file starts
+    when not given). files, e.g. from the catalog, replaces globbing the day.
+    """
+    profiler = profiler or StageProfiler(enabled=False)
+
+    if files is None:
+        with profiler.stage("glob"):
+            pattern, files = day_files(date_path, station_prefix, day_prefix)
+        if verbose:
+            print(f"{station_prefix}: Found {len(files)} files matching pattern {pattern}")
+
+    # Načítání dat
+    parts = []
+    for file_path in files:
+        start = file_start_time(file_path)
+        try:
+            with profiler.stage("read"), h5py.File(file_path, "r") as f:
+                found = find_waveform_dataset(f)
+                if not found:
+                    continue
+                # Read block by block, only the two channel columns are kept
+                diff_efi = read_channel_difference(found[1], channels)
+                time_dset = find_time_dataset(f, len(diff_efi))
+                row_times = time_dset[()].astype(np.float64) if time_dset is not None else None
+        except Exception as e:
+            print(f"Error processing file {file_path}: {str(e)}")
+            continue
+        if start is None and row_times is None:
+            print(f"Skipping {file_path}: no time dataset and no YYYYMMDD_HH[MMSS] start time in the name")
+            continue
+        profiler.count("files")
+        profiler.count("samples", len(diff_efi))
+        if verbose:
+            print(f"  - Loaded columns {channels[0]} and {channels[1]} of dataset '{found[0]}' from {os.path.basename(file_path)}: {len(diff_efi)} samples")
+        parts.append((start if start is not None else row_times[0], diff_efi, row_times))
+
+    if not parts:
+        return np.empty(0), np.empty(0)
+
+    parts.sort(key=lambda part: part[0])
+    if rate is None:
+        rate = estimate_rate([p[0] for p in parts], [len(p[1]) for p in parts])
+    with profiler.stage("concatenate"):
+        times = np.concatenate([p[2] if p[2] is not None else p[0] + np.arange(len(p[1])) / rate for p in parts])
+        values = np.concatenate([p[1] for p in parts])
+
+    if verbose:
+        print(f"{station_prefix}: Data loading complete. Processed {len(parts)} files, {len(values)} samples at {rate:.2f} rows/s.")
+    return times, values
+
+def load_day_profiled(date_path, station_prefix, day_prefix, channels, verbose, profile, rate=None, files=None):
+    # Loader process entry point, stage totals travel back with the data
+    profiler = StageProfiler(enabled=profile)
+    times, values = load_day(date_path, station_prefix, day_prefix, channels, verbose, profiler, rate, files)
+    return times, values, profiler.stages, profiler.counters
+
+def theme_colors(theme):
+    if theme == 'dark':
+        # Dark theme colors
+        return {
+            'bg_color': '#121212',
+            'text_color': 'white',
+            'line_color1': '#00B7EB',  # Cyan for even hours
+            'line_color2': '#00FF7F',  # Spring green for odd hours
+            'grid_color': '#808080',   # Brighter gray for better visibility
+            'figure_facecolor': '#1E1E1E',
+            'timestamp_color': '#808080',  # Gray
+        }
+    # Light theme colors (default)
+    return {
+        'bg_color': 'white',
+        'text_color': 'black',
+        'line_color1': 'black',    # Black for even hours
+        'line_color2': 'green',    # Green for odd hours
+        'grid_color': 'gray',
+        'figure_facecolor': 'white',
+        'timestamp_color': 'gray',
+    }
+
+def helicorder_matrix(times, values, day_start, bin_seconds=DEFAULT_BIN_SECONDS):
+    """(24, bins per hour, 2) min/max of every time bin, NaN where there is no data.
+
+    The size is fixed by bin_seconds, not by the busiest hour.
+    """
+    vmin, vmax, _, _ = day_grid(times, values, day_start, bin_seconds)
+    return np.stack([vmin, vmax], axis=-1).reshape(len(HOURS), -1, 2)
+
+def draw_helicorder(ax, efi_matrix, colors, amplitude_scale, calibration_coefficient, title, verbose=False):
+    text_color = colors['text_color']
+    ax.set_facecolor(colors['bg_color'])
+    amp_offset = 15000
+    bottom_margin = amp_offset * 2.5
+    top_margin = amp_offset * 2.2
+    ax.set_ylim(-bottom_margin, amp_offset * len(HOURS) + top_margin)
+    # Every bin is drawn as its min and max at the bin centre, which traces
+    # the same envelope as the raw samples; empty bins break the line
+    bins_per_hour = efi_matrix.shape[1]
+    minutes = np.repeat((np.arange(bins_per_hour) + 0.5) * 60 / bins_per_hour, 2)
+
+    # Hodiny opačně: 0h nahoře, 23h dole
+    for i, hour_bins in enumerate(efi_matrix):
+        base_y = (len(HOURS) - 1 - i) * amp_offset
+        row = hour_bins.ravel()
+        if not np.isnan(row).all():
+            color = colors['line_color1'] if i % 2 == 0 else colors['line_color2']
+            # Scale the data by the amplitude_scale factor
+            scaled_data = row * amplitude_scale + base_y
+            ax.plot(minutes, scaled_data, color=color, linewidth=0.7)
+            if verbose:
+                print(f"Plotting hour {HOURS[i]} data ({np.count_nonzero(~np.isnan(hour_bins[:, 0]))} of {bins_per_hour} bins with data)")
+        else:
+            if verbose:
+                print(f"No data to plot for hour {HOURS[i]}")
+
+        # Improved grid lines - thicker for better visibility in dark theme
+        ax.plot([0, 60], [base_y, base_y], color=colors['grid_color'], linewidth=0.4, linestyle="dashed")
+
+    # Set text colors
+    ax.tick_params(colors=text_color)
+    for spine in ax.spines.values():
+        spine.set_edgecolor(text_color)
+
+    yticks = [(len(HOURS) - 1 - i) * amp_offset for i in range(len(HOURS))]
+    yticklabels = [f"{h}h" for h in HOURS]
+    ax.set_yticks(yticks)
+    ax.set_yticklabels(yticklabels)
+    ax.set_xlabel("Time in minutes", color=text_color)
+    ax.set_ylabel("UTC hour", color=text_color)
+    ax.set_title(title, color=text_color)
+
+    # Svislá škála vpravo using the calibration coefficient
+    ADU_per_kVm = calibration_coefficient
+    scalebar_len = 10 * ADU_per_kVm * amplitude_scale  # Apply same scaling as the data
+    scalex = 62
+    scaley = -bottom_margin + amp_offset * 1
+    ax.plot([scalex, scalex], [scaley, scaley + scalebar_len], color=text_color, linewidth=2, zorder=5)
+
+    # Improved text positioning to prevent overlap
+    text_margin = 2000  # Margin for + and - signs
+    ax.text(scalex + 0.5, scaley + scalebar_len + text_margin, "+", color=text_color, va="center", ha="left", fontsize=15, fontweight="bold")
+    ax.text(scalex + 0.5, scaley - text_margin, "-", color=text_color, va="center", ha="left", fontsize=15, fontweight="bold")
+    # Position the kV/m text closer to the scale bar
+    ax.text(scalex + 1.5, scaley + scalebar_len / 2, "10 kV/m", color=text_color, va="center", ha="left", fontsize=12, rotation=90)
+
+def save_figure(fig, output_file, colors, output_format=None):
+    fig.tight_layout()
+
+    now_str = datetime.now(timezone.utc).strftime("Generated (UTC): %Y-%m-%d %H:%M:%S")
+    fig.text(0.99, 0.015, now_str, ha='right', va='bottom', fontsize=9, color=colors['timestamp_color'])
+
+    fig.savefig(output_file, dpi=120, facecolor=colors['figure_facecolor'], bbox_inches='tight', format=output_format)
+    plt.close(fig)
+
+def update_latest_link(processing_dir, name, output_file, verbose):
+    # Symlink na latest.png
+    latest_link = os.path.join(processing_dir, name)
+    try:
+        # Pokud symlink už existuje, smaž ho
+        if os.path.islink(latest_link) or os.path.exists(latest_link):
+            os.remove(latest_link)
+        rel_path = os.path.relpath(output_file, start=processing_dir)
+        os.symlink(rel_path, latest_link)
+        if verbose:
+            print(f"Created symlink: {latest_link} → {rel_path}")
+    except Exception as e:
+        print(f"Failed to create symlink: {e}")
+
+def write_day_pyramid(times, values, day_start, output_dir, station_prefix, day_prefix, verbose):
+    pyramid_file = pyramid_path(output_dir, station_prefix, day_prefix)
+    try:
+        write_pyramid(pyramid_file, build_pyramid(times, values, day_start, DEFAULT_LEVELS), day_start, station_prefix)
+        if verbose:
+            print(f"Saved EFI pyramid: {pyramid_file}")
+        return pyramid_file
+    except Exception as e:
+        print(f"Failed to write pyramid {pyramid_file}: {e}")
+        return None
+
+def plot_overview(args, stations, year, month, colors, verbose):
+    # Month/year views read only the 1 min level of the day pyramids
+    processing_dir = args.output
+    days = period_days(args.period, int(year), int(month))
+    if args.period == 'month':
+        label = f"{year}-{month}"
+        output_dir = os.path.join(processing_dir, f"{year}_{month}")
+        name = f"EFI_MONTH_{year}{month}"
+    else:
+        label = year
+        output_dir = os.path.join(processing_dir, year)
+        name = f"EFI_YEAR_{year}"
+    os.makedirs(output_dir, exist_ok=True)
+
+    for station_prefix in stations:
+        vmin, vmax, vmean, missing = load_period(processing_dir, station_prefix, days, verbose)
+        if len(missing) == len(days):
+            print(f"ERROR: No day pyramids found for {station_prefix} in {label}. Run the daily plots first.")
+            continue
+        if missing:
+            print(f"{station_prefix}: {len(missing)} of {len(days)} days have no pyramid and are left empty")
+            if verbose:
+                print("  Missing: " + ", ".join(day.strftime("%Y%m%d") for day in missing))
+
+        title = f"{station_prefix} EFI: {label} (Observatory: {args.observatory})"
+        if args.period == 'month':
+            fig, ax = plt.subplots(figsize=(14, 12))
+            fig.patch.set_facecolor(colors['figure_facecolor'])
+            draw_month(ax, days, vmin, vmax, vmean, colors, args.scale, title)
+        else:
+            fig, (ax_image, ax_daily) = plt.subplots(2, 1, figsize=(16, 9), sharex=True, gridspec_kw={'height_ratios': [3, 1]})
+            fig.patch.set_facecolor(colors['figure_facecolor'])
+            draw_year(ax_image, ax_daily, days, vmin, vmax, vmean, colors, args.calibration, title)
+
+        output_file = os.path.join(output_dir, f"{station_prefix}_{name}.{args.format}")
+        save_figure(fig, output_file, colors)
+        print(f"Saved {args.period} EFI overview: {output_file}")
+        update_latest_link(processing_dir, f"{station_prefix}_{args.period}_latest.png", output_file, verbose)
 
 def main():
     args = parse_arguments()
     verbose = args.verbose
-    
+    profiler = StageProfiler(enabled=args.profile is not None)
+
     # Get format, theme and calibration from args
     output_format = args.format
     theme = args.theme
     calibration_coefficient = args.calibration
     amplitude_scale = args.scale
-    
+    channels = args.channels
+
     if verbose:
         print("=== EFI Helicorder Plot Generator ===")
         print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -48,30 +289,30 @@ def main():
         print(f"Using theme: {theme}")
         print(f"Using calibration coefficient: {calibration_coefficient}")
         print(f"Using amplitude scaling factor: {amplitude_scale}x")
-    
-    # Set station prefix from arguments
-    station_prefix = args.station
+
+    # Set station prefixes from arguments
+    stations = args.station
     observatory_name = args.observatory
-    
+
     if verbose:
-        print(f"Station: {station_prefix}")
+        print(f"Stations: {', '.join(stations)}")
         print(f"Observatory: {observatory_name}")
-    
+
     # Kořenová složka dat
     base_data_dir = args.input
     # Kořenová složka pro výstupy
     processing_dir = args.output
-    
+
     if verbose:
         print(f"Input directory: {base_data_dir}")
         print(f"Output directory: {processing_dir}")
-    
+
     # Určení dne (UTC)
     if args.date:
         # Parse date from input format YYYYMMDD
         year = args.date[:4]
-        month = args.date[4:6]
-        day = args.date[6:8]
+        month = args.date[4:6] or '01'
+        day = args.date[6:8] or '01'
         day_to_plot = datetime(int(year), int(month), int(day))
         if verbose:
             print(f"Using specified date: {year}-{month}-{day}")
@@ -85,218 +326,121 @@ def main():
             day_to_plot = now
             if verbose:
                 print("Using today's date")
-        
+
         year = f"{day_to_plot.year:04d}"
         month = f"{day_to_plot.month:02d}"
         day = f"{day_to_plot.day:02d}"
         if verbose:
             print(f"Selected date: {year}-{month}-{day}")
-    
+
+    if args.period != 'day':
+        plot_overview(args, stations, year, month, theme_colors(theme), verbose)
+        if verbose:
+            print("=== Processing complete ===")
+        return
+
     day_prefix = f"{year}{month}{day}"
     print(f"Processing date: {day_prefix}")
-    
+
     # Vstupní cesta ke složce s daty pro daný den
     date_path = os.path.join(base_data_dir, year, month, day)
-    
+
     if verbose:
         print(f"Looking for data in: {date_path}")
-    
+
     # Výstupní složka ve formátu YYYY_MM
     output_dir = os.path.join(processing_dir, f"{year}_{month}")
     os.makedirs(output_dir, exist_ok=True)
-    output_file = os.path.join(output_dir, f"{station_prefix}_EFI_HELICORDER_{day_prefix}.{output_format}")
-    
+
     if verbose:
         print(f"Created output directory: {output_dir}")
-        print(f"Output file will be: {output_file}")
-    
-    hours = [f"{int(h):02d}" for h in range(24)]
-    efi_blocks = []
-    
+
+    day_start = datetime(int(year), int(month), int(day), tzinfo=timezone.utc).timestamp()
+
     if verbose:
         print("Starting data loading process...")
-    
-    total_files_processed = 0
-    hours_with_data = 0
-    
-    # Načítání dat
-    for hour in hours:
-        pattern = os.path.join(date_path, f"{station_prefix}_{day_prefix}_{hour}*.h5")
-        files = sorted(glob.glob(pattern))
-        
+
+    station_files = {s: None for s in stations}
+    if args.catalog:
+        # Only the plotted day and the day before (its last file may run past midnight) are rescanned
+        with profiler.stage("catalog"):
+            conn = open_catalog(args.catalog)
+            previous = datetime.fromtimestamp(day_start - 86400, timezone.utc)
+            changed, removed = update_catalog(conn, base_data_dir, [os.path.join(year, month, day), previous.strftime("%Y/%m/%d")], verbose)
+            for s in stations:
+                station_files[s] = [row["path"] for row in files_in_window(conn, s, day_start, day_start + 86400)]
+            conn.close()
         if verbose:
-            print(f"Hour {hour}: Found {len(files)} files matching pattern {pattern}")
-        
-        hour_efi = []
-        files_in_hour = 0
-        
-        for file_path in files:
-            try:
-                with h5py.File(file_path, "r") as f:
-                    data = None
-                    if "waveform" in f:
-                        data = f["waveform"][()]
-                        if verbose:
-                            print(f"  - Loaded waveform data from {os.path.basename(file_path)}")
-                    else:
-                        found = find_2d_dataset(f)
-                        if found:
-                            data = found[1][()]
-                            if verbose:
-                                print(f"  - Found 2D dataset '{found[0]}' in {os.path.basename(file_path)}")
-                    
-                    if data is not None:
-                        diff_efi = data[:, 13] - data[:, 33]
-                        hour_efi.append(diff_efi)
-                        files_in_hour += 1
-                        total_files_processed += 1
-                        if verbose:
-                            print(f"  - Processed EFI data with {len(diff_efi)} samples")
-            except Exception as e:
-                print(f"Error processing file {file_path}: {str(e)}")
-        
-        if hour_efi:
-            hour_efi_arr = np.concatenate(hour_efi)
-            efi_blocks.append(hour_efi_arr)
-            hours_with_data += 1
-            if verbose:
-                print(f"  * Hour {hour}: Successfully processed {files_in_hour} files with total {len(hour_efi_arr)} samples")
-        else:
-            efi_blocks.append(None)
-            if verbose:
-                print(f"  * Hour {hour}: No data available")
-    
-    if verbose:
-        print(f"Data loading complete. Processed {total_files_processed} files across {hours_with_data} hours.")
-    
-    # Check if we have any data
-    if not any(block is not None for block in efi_blocks):
-        print(f"ERROR: No data found for date {day_prefix}. Cannot generate plot.")
-        return
-    
-    # Max délka dat
-    maxlen = max(len(b) for b in efi_blocks if b is not None)
-    if verbose:
-        print(f"Maximum samples per hour: {maxlen}")
-    
-    efi_matrix = np.full((len(efi_blocks), maxlen), np.nan)
-    for i, b in enumerate(efi_blocks):
-        if b is not None:
-            L = len(b)
-            efi_matrix[i, :L] = b
-            
-    if verbose:
-        print("Starting plot generation...")
-    
-    # Define theme colors
-    if theme == 'dark':
-        # Dark theme colors
-        bg_color = '#121212'
-        text_color = 'white'
-        line_color1 = '#00B7EB'  # Cyan for even hours
-        line_color2 = '#00FF7F'  # Spring green for odd hours
-        grid_color = '#808080'   # Brighter gray for better visibility
-        figure_facecolor = '#1E1E1E'
-        timestamp_color = '#808080'  # Gray
+            print(f"Catalog {args.catalog}: {changed} files added or changed, {removed} removed")
+
+    # Stations are loaded in parallel processes, each reads its own files
+    if len(stations) > 1:
+        with profiler.stage("load"), ProcessPoolExecutor(max_workers=args.workers or len(stations)) as pool:
+            futures = [pool.submit(load_day_profiled, date_path, s, day_prefix, channels, verbose, profiler.enabled, args.rate, station_files[s]) for s in stations]
+            results = [f.result() for f in futures]
+        station_data = []
+        for station_prefix, (times, values, stages, counters) in zip(stations, results):
+            station_data.append((times, values))
+            profiler.merge(stages, counters, prefix=f"{station_prefix}/")
     else:
-        # Light theme colors (default)
-        bg_color = 'white'
-        text_color = 'black'
-        line_color1 = 'black'    # Black for even hours
-        line_color2 = 'green'    # Green for odd hours
-        grid_color = 'gray'
-        figure_facecolor = 'white'
-        timestamp_color = 'gray'
-    
-    # Create plot with theme colors
-    fig, ax = plt.subplots(figsize=(14, 10))
-    fig.patch.set_facecolor(figure_facecolor)
-    ax.set_facecolor(bg_color)
-    amp_offset = 15000
-    bottom_margin = amp_offset * 2.5
-    top_margin = amp_offset * 2.2
-    ax.set_ylim(-bottom_margin, amp_offset * len(hours) + top_margin)
-    
-    if verbose:
-        print("Setting up plot layout and axes...")
-        print(f"Using amplitude scaling factor: {amplitude_scale}x")
-    
-    # Hodiny opačně: 0h nahoře, 23h dole
-    for i, row in enumerate(efi_matrix):
-        base_y = (len(hours) - 1 - i) * amp_offset
-        if not np.isnan(row).all():
-            color = line_color1 if i % 2 == 0 else line_color2
-            # Scale the data by the amplitude_scale factor
-            scaled_data = row * amplitude_scale + base_y
-            ax.plot(np.linspace(0, 60, maxlen), scaled_data, color=color, linewidth=0.7)
-            if verbose:
-                print(f"Plotting hour {hours[i]} data ({len(row[~np.isnan(row)])} valid points)")
-        else:
-            if verbose:
-                print(f"No data to plot for hour {hours[i]}")
-                
-        # Improved grid lines - thicker for better visibility in dark theme
-        ax.plot([0, 60], [base_y, base_y], color=grid_color, linewidth=0.4, linestyle="dashed")
-    
-    # Set text colors
-    ax.tick_params(colors=text_color)
-    for spine in ax.spines.values():
-        spine.set_edgecolor(text_color)
-    
-    if verbose:
-        print("Adding axis labels and ticks...")
-        
-    yticks = [(len(hours) - 1 - i) * amp_offset for i in range(len(hours))]
-    yticklabels = [f"{h}h" for h in hours]
-    ax.set_yticks(yticks)
-    ax.set_yticklabels(yticklabels)
-    ax.set_xlabel("Time in minutes", color=text_color)
-    ax.set_ylabel("UTC hour", color=text_color)
-    ax.set_title(f"{station_prefix} EFI: {year}-{month}-{day} (Observatory: {observatory_name})", color=text_color)
-    
-    if verbose:
-        print("Adding scale bar...")
-    
-    # Svislá škála vpravo using the calibration coefficient
-    ADU_per_kVm = calibration_coefficient
-    scalebar_len = 10 * ADU_per_kVm * amplitude_scale  # Apply same scaling as the data
-    scalex = 62
-    scaley = -bottom_margin + amp_offset * 1
-    ax.plot([scalex, scalex], [scaley, scaley + scalebar_len], color=text_color, linewidth=2, zorder=5)
-    
-    # Improved text positioning to prevent overlap
-    text_margin = 2000  # Margin for + and - signs
-    ax.text(scalex + 0.5, scaley + scalebar_len + text_margin, "+", color=text_color, va="center", ha="left", fontsize=15, fontweight="bold")
-    ax.text(scalex + 0.5, scaley - text_margin, "-", color=text_color, va="center", ha="left", fontsize=15, fontweight="bold")
-    # Position the kV/m text closer to the scale bar
-    ax.text(scalex + 1.5, scaley + scalebar_len / 2, "10 kV/m", color=text_color, va="center", ha="left", fontsize=12, rotation=90)
-    
-    plt.tight_layout()
-    
-    now_str = datetime.now(timezone.utc).strftime("Generated (UTC): %Y-%m-%d %H:%M:%S")
-    fig.text(0.99, 0.015, now_str, ha='right', va='bottom', fontsize=9, color=timestamp_color)
-    
-    if verbose:
-        print(f"Saving plot to: {output_file}")
-    
-    plt.savefig(output_file, dpi=120, facecolor=figure_facecolor, bbox_inches='tight')
-    plt.close()
-    print(f"Saved daily EFI helicorder: {output_file}")
+        station_data = [load_day(date_path, stations[0], day_prefix, channels, verbose, profiler, args.rate, station_files[stations[0]])]
 
+    colors = theme_colors(theme)
+    matrices = {}
 
-    # Symlink na latest.png
-    latest_link = os.path.join(processing_dir, f"{station_prefix}_latest.png")
-    try:
-        # Pokud symlink už existuje, smaž ho
-        if os.path.islink(latest_link) or os.path.exists(latest_link):
-            os.remove(latest_link)
-        rel_path = os.path.relpath(output_file, start=processing_dir)
-        os.symlink(rel_path, latest_link)
+    for station_prefix, (times, values) in zip(stations, station_data):
+        output_file = os.path.join(output_dir, f"{station_prefix}_EFI_HELICORDER_{day_prefix}.{output_format}")
+
+        # Check if we have any data
+        if len(values) == 0:
+            print(f"ERROR: No data found for {station_prefix} on date {day_prefix}. Cannot generate plot.")
+            continue
+
+        if not args.no_pyramid:
+            with profiler.stage("pyramid"):
+                write_day_pyramid(times, values, day_start, output_dir, station_prefix, day_prefix, verbose)
+
+        with profiler.stage("grid"):
+            efi_matrix = helicorder_matrix(times, values, day_start, args.bin_seconds)
+        matrices[station_prefix] = efi_matrix
         if verbose:
-            print(f"Created symlink: {latest_link} → {rel_path}")
-    except Exception as e:
-        print(f"Failed to create symlink: {e}")
+            print(f"Time bins per hour: {efi_matrix.shape[1]}")
+            print("Starting plot generation...")
+
+        # Create plot with theme colors
+        with profiler.stage("plot"):
+            fig, ax = plt.subplots(figsize=(14, 10))
+            fig.patch.set_facecolor(colors['figure_facecolor'])
+            draw_helicorder(ax, efi_matrix, colors, amplitude_scale, calibration_coefficient,
+                            f"{station_prefix} EFI: {year}-{month}-{day} (Observatory: {observatory_name})", verbose)
+
+        if verbose:
+            print(f"Saving plot to: {output_file}")
+
+        with profiler.stage("savefig"):
+            save_figure(fig, output_file, colors)
+        print(f"Saved daily EFI helicorder: {output_file}")
+
+        update_latest_link(processing_dir, f"{station_prefix}_latest.png", output_file, verbose)
+
+    # Composite: all stations with data side by side in one figure
+    if len(matrices) > 1:
+        composite_file = os.path.join(output_dir, f"COMPOSITE_EFI_HELICORDER_{day_prefix}.{output_format}")
+        with profiler.stage("composite plot"):
+            fig, axes = plt.subplots(1, len(matrices), figsize=(7 * len(matrices), 10), sharey=True)
+            fig.patch.set_facecolor(colors['figure_facecolor'])
+            for ax, (station_prefix, efi_matrix) in zip(axes, matrices.items()):
+                draw_helicorder(ax, efi_matrix, colors, amplitude_scale, calibration_coefficient, station_prefix)
+            fig.suptitle(f"EFI: {year}-{month}-{day} (Observatory: {observatory_name})", color=colors['text_color'])
+        with profiler.stage("composite savefig"):
+            save_figure(fig, composite_file, colors)
+        print(f"Saved composite EFI helicorder: {composite_file}")
+        update_latest_link(processing_dir, "COMPOSITE_latest.png", composite_file, verbose)
 
+    if profiler.enabled:
+        profile_file = args.profile or os.path.join(output_dir, f"PROFILE_{day_prefix}.json")
+        print_summary(profiler.write(profile_file))
+        print(f"Saved stage profile: {profile_file}")
 
     if verbose:
         print("=== Processing complete ===")
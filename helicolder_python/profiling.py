@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+import resource
+from contextlib import contextmanager
+
+# Per-stage wall time, CPU time and peak RSS of a plot.py run. A stage may be
+# entered many times (every file is a "read"), the report sums them up.
+# Stages must not be nested, each one resets the peak RSS counter.
+
+CLEAR_REFS = "/proc/self/clear_refs"
+STATUS = "/proc/self/status"
+
+
+def _vm_kb(field):
+    try:
+        with open(STATUS) as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak():
+    # Writing 5 resets VmHWM to the current RSS (Linux 4.0+)
+    try:
+        with open(CLEAR_REFS, "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _cpu():
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (self_usage.ru_utime + self_usage.ru_stime,
+            children.ru_utime + children.ru_stime,
+            children.ru_maxrss)
+
+
+class StageProfiler:
+    """Collects stage totals; a disabled profiler only passes through."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = {}
+        self.counters = {}
+        self.start_wall = time.perf_counter()
+        self.start_cpu = _cpu()
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        exact_peak = _reset_peak()
+        wall = time.perf_counter()
+        cpu, child_cpu, _ = _cpu()
+        try:
+            yield
+        finally:
+            end_cpu, end_child_cpu, child_rss = _cpu()
+            peak_kb = _vm_kb("VmHWM") if exact_peak else None
+            if peak_kb is None:
+                # Peak of the whole process so far, not only of this stage
+                peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            entry = self.stages.setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0, "children_cpu": 0.0,
+                                                  "peak_rss_mb": 0.0, "children_peak_rss_mb": 0.0})
+            entry["calls"] += 1
+            entry["wall"] += time.perf_counter() - wall
+            entry["cpu"] += end_cpu - cpu
+            entry["children_cpu"] += end_child_cpu - child_cpu
+            entry["peak_rss_mb"] = max(entry["peak_rss_mb"], peak_kb / 1024)
+            if end_child_cpu > child_cpu:
+                entry["children_peak_rss_mb"] = max(entry["children_peak_rss_mb"], child_rss / 1024)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, stages, counters, prefix=""):
+        # Adds stage totals collected in another process
+        for name, other in stages.items():
+            entry = self.stages.setdefault(prefix + name, dict(other, calls=0, wall=0.0, cpu=0.0, children_cpu=0.0))
+            for key in ("calls", "wall", "cpu", "children_cpu"):
+                entry[key] += other[key]
+            for key in ("peak_rss_mb", "children_peak_rss_mb"):
+                entry[key] = max(entry[key], other[key])
+        for name, n in counters.items():
+            self.counters[prefix + name] = self.counters.get(prefix + name, 0) + n
+
+    def report(self):
+        cpu, child_cpu, child_rss = _cpu()
+        return {
+            "argv": sys.argv,
+            "pid": os.getpid(),
+            "wall": time.perf_counter() - self.start_wall,
+            "cpu": cpu - self.start_cpu[0],
+            "children_cpu": child_cpu - self.start_cpu[1],
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "children_peak_rss_mb": child_rss / 1024,
+            "stages": self.stages,
+            "counters": self.counters,
+        }
+
+    def write(self, path):
+        report = self.report()
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        return report
+
+
+def print_summary(report):
+    print(f"{'stage':<24} {'calls':>6} {'wall s':>9} {'cpu s':>9} {'peak MB':>9}")
+    for name, s in sorted(report["stages"].items(), key=lambda item: -item[1]["wall"]):
+        print(f"{name:<24} {s['calls']:>6} {s['wall']:>9.3f} {s['cpu'] + s['children_cpu']:>9.3f} "
+              f"{max(s['peak_rss_mb'], s['children_peak_rss_mb']):>9.1f}")
+    print(f"{'total':<24} {'':>6} {report['wall']:>9.3f} {report['cpu'] + report['children_cpu']:>9.3f} "
+          f"{max(report['peak_rss_mb'], report['children_peak_rss_mb']):>9.1f}")
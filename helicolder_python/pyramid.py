@@ -0,0 +1,214 @@
+import os
+import tempfile
+import h5py
+import numpy as np
+
+# Bin widths of the pyramid levels in seconds, finest first
+DEFAULT_LEVELS = (0.01, 0.1, 1.0, 10.0, 60.0)
+
+DAY_SECONDS = 86400
+
+
+def pyramid_path(output_dir, station_prefix, day_prefix):
+    return os.path.join(output_dir, f"{station_prefix}_EFI_PYRAMID_{day_prefix}.h5")
+
+
+def _aggregate(bins, vmin, vmax, vsum, count):
+    # bins must be sorted; collapses runs of equal bin numbers
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    return (bins[starts],
+            np.minimum.reduceat(vmin, starts),
+            np.maximum.reduceat(vmax, starts),
+            np.add.reduceat(vsum, starts),
+            np.add.reduceat(count, starts))
+
+
+def build_pyramid(times, values, day_start, levels=DEFAULT_LEVELS):
+    """Bin samples into min/max/mean levels.
+
+    times are seconds since the epoch, day_start the epoch time of 00:00 UTC.
+    Every level must be an integer multiple of the previous one.
+    Only non-empty bins are kept, so each level is a sparse list of
+    (bin index, min, max, mean, count) rows.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    valid = np.isfinite(times) & np.isfinite(values)
+    offsets = times[valid] - day_start
+    values = values[valid]
+    inside = (offsets >= 0) & (offsets < DAY_SECONDS)
+    offsets = offsets[inside]
+    values = values[inside]
+
+    order = np.argsort(offsets, kind='stable')
+    offsets = offsets[order]
+    values = values[order]
+
+    pyramid = {}
+    levels = sorted(levels)
+    if len(offsets) == 0:
+        for width in levels:
+            empty = np.empty(0)
+            pyramid[width] = (empty.astype(np.int64), empty, empty, empty, empty.astype(np.int64))
+        return pyramid
+
+    # Finest level from the samples, every coarser level from the one below it
+    bins = np.floor(offsets / levels[0]).astype(np.int64)
+    current = _aggregate(bins, values, values, values, np.ones(len(values), dtype=np.int64))
+    prev_width = levels[0]
+    for width in levels:
+        if width != prev_width:
+            ratio = int(round(width / prev_width))
+            current = _aggregate(current[0] // ratio, *current[1:])
+            prev_width = width
+        bins, vmin, vmax, vsum, count = current
+        pyramid[width] = (bins, vmin, vmax, vsum / count, count)
+    return pyramid
+
+
+def day_grid(times, values, day_start, bin_seconds=1.0):
+    """Dense (min, max, mean, count) arrays of the day on a fixed bin grid.
+
+    Every sample lands in the bin of its own timestamp, so gaps stay NaN and
+    uneven files do not shift anything. The size depends only on bin_seconds.
+    """
+    n_bins = int(round(DAY_SECONDS / bin_seconds))
+    vmin = np.full(n_bins, np.nan)
+    vmax = np.full(n_bins, np.nan)
+    vmean = np.full(n_bins, np.nan)
+
+    offsets = np.asarray(times, dtype=np.float64) - day_start
+    values = np.asarray(values, dtype=np.float64)
+    inside = (offsets >= 0) & (offsets < DAY_SECONDS) & np.isfinite(values)
+    bins = np.floor(offsets[inside] / bin_seconds).astype(np.int64)
+    values = values[inside]
+    if len(bins) and np.any(bins[1:] < bins[:-1]):
+        order = np.argsort(bins, kind='stable')
+        bins = bins[order]
+        values = values[order]
+
+    count = np.bincount(bins, minlength=n_bins)
+    filled = count > 0
+    if filled.any():
+        starts = np.searchsorted(bins, np.flatnonzero(filled))
+        vmin[filled] = np.minimum.reduceat(values, starts)
+        vmax[filled] = np.maximum.reduceat(values, starts)
+        vmean[filled] = np.bincount(bins, weights=values, minlength=n_bins)[filled] / count[filled]
+    return vmin, vmax, vmean, count
+
+
+def write_pyramid(path, pyramid, day_start, station_prefix):
+    # Every writer gets its own temporary file, concurrent builds of the same
+    # day cannot clobber each other and the last complete one wins
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=os.path.dirname(path) or ".")
+    os.close(fd)
+    try:
+        _write_pyramid_file(tmp_path, pyramid, day_start, station_prefix)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _write_pyramid_file(tmp_path, pyramid, day_start, station_prefix):
+    with h5py.File(tmp_path, "w") as f:
+        f.attrs["station"] = station_prefix
+        f.attrs["day_start"] = day_start
+        f.attrs["levels"] = np.array(sorted(pyramid))
+        for width in sorted(pyramid):
+            bins, vmin, vmax, vmean, count = pyramid[width]
+            grp = f.create_group(f"level_{width:g}")
+            grp.attrs["bin_seconds"] = width
+            opts = dict(compression="gzip", shuffle=True) if len(bins) > 1024 else {}
+            grp.create_dataset("bin", data=bins.astype(np.int32), **opts)
+            grp.create_dataset("min", data=vmin.astype(np.float32), **opts)
+            grp.create_dataset("max", data=vmax.astype(np.float32), **opts)
+            grp.create_dataset("mean", data=vmean.astype(np.float32), **opts)
+            grp.create_dataset("count", data=count.astype(np.int32), **opts)
+            # Row offset of the first bin of every minute, so a window read
+            # touches only the rows it needs
+            minute_of_bin = bins // max(int(round(60 / width)), 1)
+            grp.create_dataset("minute_offsets", data=np.searchsorted(minute_of_bin, np.arange(1441)).astype(np.int64))
+
+
+def choose_level(levels, duration, width_px):
+    # Coarsest level that still gives at least one bin per pixel
+    wanted = duration / max(int(width_px), 1)
+    usable = [w for w in sorted(levels) if w <= wanted]
+    return usable[-1] if usable else min(levels)
+
+
+def query_pyramid(path, start, end, width_px):
+    """Return (times, min, max, mean) for [start, end) at width_px pixels.
+
+    start and end are epoch seconds. Each output array has width_px entries,
+    empty pixels are NaN. Only the rows of a single level are read.
+    """
+    edges = np.linspace(start, end, int(width_px) + 1)
+    out_min = np.full(int(width_px), np.nan)
+    out_max = np.full(int(width_px), np.nan)
+    out_mean = np.full(int(width_px), np.nan)
+
+    with h5py.File(path, "r") as f:
+        day_start = float(f.attrs["day_start"])
+        width = choose_level(list(f.attrs["levels"]), end - start, width_px)
+        grp = f[f"level_{width:g}"]
+        offsets = grp["minute_offsets"]
+        first_minute = int(np.clip(np.floor((start - day_start) / 60), 0, 1440))
+        last_minute = int(np.clip(np.ceil((end - day_start) / 60), 0, 1440))
+        row0 = int(offsets[first_minute])
+        row1 = int(offsets[last_minute])
+        bins = grp["bin"][row0:row1]
+        vmin = grp["min"][row0:row1].astype(np.float64)
+        vmax = grp["max"][row0:row1].astype(np.float64)
+        vmean = grp["mean"][row0:row1].astype(np.float64)
+        count = grp["count"][row0:row1].astype(np.float64)
+
+    centers = day_start + (bins + 0.5) * width
+    keep = (centers >= start) & (centers < end)
+    centers = centers[keep]
+    if len(centers):
+        pixel = np.clip(np.searchsorted(edges, centers, side='right') - 1, 0, int(width_px) - 1)
+        starts = np.flatnonzero(np.r_[True, pixel[1:] != pixel[:-1]])
+        px = pixel[starts]
+        out_min[px] = np.minimum.reduceat(vmin[keep], starts)
+        out_max[px] = np.maximum.reduceat(vmax[keep], starts)
+        weights = count[keep]
+        out_mean[px] = np.add.reduceat(vmean[keep] * weights, starts) / np.add.reduceat(weights, starts)
+
+    times = (edges[:-1] + edges[1:]) / 2
+    return times, out_min, out_max, out_mean
+
+
+def read_minutes(path, width=60.0):
+    """Dense per-minute (min, max, mean, count) arrays of one day pyramid.
+
+    Only the coarsest level not above width is read; empty minutes are NaN.
+    """
+    minutes = DAY_SECONDS // 60
+    out_min = np.full(minutes, np.nan)
+    out_max = np.full(minutes, np.nan)
+    out_mean = np.full(minutes, np.nan)
+    out_count = np.zeros(minutes, dtype=np.int64)
+
+    with h5py.File(path, "r") as f:
+        levels = [w for w in sorted(f.attrs["levels"]) if w <= width]
+        level = levels[-1] if levels else min(f.attrs["levels"])
+        grp = f[f"level_{level:g}"]
+        bins = grp["bin"][:].astype(np.int64)
+        vmin = grp["min"][:].astype(np.float64)
+        vmax = grp["max"][:].astype(np.float64)
+        count = grp["count"][:].astype(np.int64)
+        vsum = grp["mean"][:].astype(np.float64) * count
+
+    if len(bins):
+        ratio = max(int(round(60 / level)), 1)
+        bins, vmin, vmax, vsum, count = _aggregate(bins // ratio, vmin, vmax, vsum, count)
+        out_min[bins] = vmin
+        out_max[bins] = vmax
+        out_mean[bins] = vsum / count
+        out_count[bins] = count
+    return out_min, out_max, out_mean, out_count
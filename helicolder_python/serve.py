@@ -0,0 +1,353 @@
+import io
+import json
+import os
+import re
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import h5py
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+
+from plot import day_files, draw_helicorder, helicorder_matrix, load_day, save_figure, theme_colors
+from pyramid import DEFAULT_LEVELS, build_pyramid, pyramid_path, query_pyramid, write_pyramid
+from waveform import estimate_rate, file_start_time, find_time_dataset, find_waveform_dataset
+
+INDEX = """<html><body><h2>EFM quicklook</h2><ul>
+<li>/helicorder?station=THUNDERMILL01&amp;date=YYYYMMDD&amp;theme=dark</li>
+<li>/window?station=THUNDERMILL01&amp;start=2024-07-10T12:00&amp;end=2024-07-10T13:00&amp;width=1200&amp;height=400</li>
+<li>/p2p?station=THUNDERMILL01&amp;start=2024-07-10T12:00&amp;end=2024-07-10T12:10&amp;width=1200&amp;height=400</li>
+<li>/stats</li>
+</ul></body></html>
+"""
+
+# Station prefixes end up in file names, nothing that could leave --output
+STATION_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Local HTTP server rendering EFI quicklooks on request.')
+    parser.add_argument('--input', type=str, required=True, help='Root directory containing waveform data')
+    parser.add_argument('--output', type=str, required=True, help='Root directory of plot.py outputs, pyramids are read from and written there')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on (default: 8080)')
+    parser.add_argument('--cache-mb', type=float, default=256, help='Size limit of the rendered image cache in MB (default: 256)')
+    parser.add_argument('--render-workers', type=int, default=2, help='Renders running at the same time (default: 2)')
+    parser.add_argument('--observatory', type=str, default='Musala', help='Name of the observatory (default: Musala)')
+    parser.add_argument('--calibration', type=float, default=1/1.4244*1000, help='Calibration coefficient for ADU to kV/m conversion (default: 701.98)')
+    parser.add_argument('--scale', type=float, default=4.0, help='Amplitude scaling factor for visualization (default: 4.0)')
+    parser.add_argument('--channels', type=int, nargs=2, default=[13, 33], metavar=('A', 'B'), help='Waveform columns whose difference A - B is plotted (default: 13 33)')
+    return parser.parse_args()
+
+
+class RenderCache:
+    """Size-bounded LRU of rendered images with request coalescing.
+
+    Concurrent requests for the same key wait for a single render instead
+    of starting their own.
+    """
+
+    def __init__(self, max_bytes, render_workers=2):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.render_slots = threading.Semaphore(render_workers)
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key, render):
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return self.items[key]
+            pending = self.inflight.get(key)
+            if pending is None:
+                pending = self.inflight[key] = {"done": threading.Event(), "value": None, "error": None}
+                owner = True
+                self.misses += 1
+            else:
+                owner = False
+                self.coalesced += 1
+
+        if not owner:
+            pending["done"].wait()
+            if pending["error"] is not None:
+                raise pending["error"]
+            return pending["value"]
+
+        try:
+            with self.render_slots:
+                value = render()
+            pending["value"] = value
+            self._put(key, value)
+            return value
+        except Exception as e:
+            pending["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            pending["done"].set()
+
+    def _put(self, key, value):
+        with self.lock:
+            if len(value) > self.max_bytes:
+                return
+            self.items[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, old = self.items.popitem(last=False)
+                self.size -= len(old)
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.items), "bytes": self.size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "coalesced": self.coalesced}
+
+
+def parse_time(value):
+    # Epoch seconds or ISO 8601, naive times are UTC
+    try:
+        return float(value)
+    except ValueError:
+        t = datetime.fromisoformat(value)
+        if t.tzinfo is None:
+            t = t.replace(tzinfo=timezone.utc)
+        return t.timestamp()
+
+
+def fresh_key(start, end):
+    # Products reaching into today are still growing, their cache entries live for one hour
+    now = datetime.now(timezone.utc)
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    return now.strftime("%Y%m%d%H") if end > today else None
+
+
+def days_in(start, end):
+    day = datetime.fromtimestamp(start, timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    while day.timestamp() < end:
+        yield day
+        day += timedelta(days=1)
+
+
+def figure_to_bytes(fig, colors):
+    buf = io.BytesIO()
+    save_figure(fig, buf, colors, output_format='png')
+    return buf.getvalue()
+
+
+class Quicklooks:
+    def __init__(self, args):
+        self.args = args
+        # One pyramid build per station day at a time, whichever windows ask for it
+        self.pyramid_locks = {}
+        self.pyramid_locks_lock = threading.Lock()
+
+    def pyramid_lock(self, station, day_prefix):
+        with self.pyramid_locks_lock:
+            return self.pyramid_locks.setdefault((station, day_prefix), threading.Lock())
+
+    def helicorder(self, station, date, theme):
+        year, month, day = date[:4], date[4:6], date[6:8]
+        date_path = os.path.join(self.args.input, year, month, day)
+        times, values = load_day(date_path, station, date, self.args.channels, False)
+        if len(values) == 0:
+            raise LookupError(f"No data found for {station} on date {date}")
+        day_start = datetime(int(year), int(month), int(day), tzinfo=timezone.utc).timestamp()
+        colors = theme_colors(theme)
+        fig = Figure(figsize=(14, 10))
+        fig.patch.set_facecolor(colors['figure_facecolor'])
+        draw_helicorder(fig.add_subplot(), helicorder_matrix(times, values, day_start), colors, self.args.scale, self.args.calibration,
+                        f"{station} EFI: {year}-{month}-{day} (Observatory: {self.args.observatory})")
+        return figure_to_bytes(fig, colors)
+
+    def day_pyramid(self, station, day):
+        # Reduced cache first; built from the archive (and kept) when missing
+        year, month, dd = day.strftime("%Y"), day.strftime("%m"), day.strftime("%d")
+        day_prefix = f"{year}{month}{dd}"
+        output_dir = os.path.join(self.args.output, f"{year}_{month}")
+        path = pyramid_path(output_dir, station, day_prefix)
+        date_path = os.path.join(self.args.input, year, month, dd)
+        # Requests waiting here find the pyramid the first one built; a failed
+        # build raises, so no blank image gets cached
+        with self.pyramid_lock(station, day_prefix):
+            if os.path.exists(path):
+                # Rebuilt when the archive got newer data since, e.g. today's growing file
+                _, files = day_files(date_path, station, day_prefix)
+                newest = max((os.path.getmtime(f) for f in files), default=None)
+                if newest is None or newest <= os.path.getmtime(path):
+                    return path
+            times, values = load_day(date_path, station, day_prefix, self.args.channels, False)
+            if len(values) == 0:
+                return None
+            os.makedirs(output_dir, exist_ok=True)
+            write_pyramid(path, build_pyramid(times, values, day.timestamp(), DEFAULT_LEVELS), day.timestamp(), station)
+            return path
+
+    def window(self, station, start, end, width, height, theme):
+        times, vmin, vmax, vmean = [], [], [], []
+        for day in days_in(start, end):
+            lo = max(start, day.timestamp())
+            hi = min(end, day.timestamp() + 86400)
+            px = max(int(round(width * (hi - lo) / (end - start))), 1)
+            path = self.day_pyramid(station, day)
+            if path is None:
+                t = np.linspace(lo, hi, px, endpoint=False)
+                empty = np.full(px, np.nan)
+                parts = (t, empty, empty, empty)
+            else:
+                parts = query_pyramid(path, lo, hi, px)
+            for acc, part in zip((times, vmin, vmax, vmean), parts):
+                acc.append(part)
+        return self.envelope_plot(np.concatenate(times), np.concatenate(vmin), np.concatenate(vmax), np.concatenate(vmean),
+                                  width, height, theme, f"{station} EFI (ch {self.args.channels[0]} - {self.args.channels[1]})", "EFI [ADU]")
+
+    def p2p(self, station, start, end, width, height, theme):
+        # Signed peak-to-peak of every rotation, straight from the archive
+        edges = np.linspace(start, end, width + 1)
+        vmin = np.full(width, np.inf)
+        vmax = np.full(width, -np.inf)
+        for day in days_in(start, end):
+            day_prefix = day.strftime("%Y%m%d")
+            date_path = os.path.join(self.args.input, day.strftime("%Y"), day.strftime("%m"), day.strftime("%d"))
+            _, files = day_files(date_path, station, day_prefix)
+            starts, rows = [], []
+            for file_path in files:
+                with h5py.File(file_path, "r") as f:
+                    found = find_waveform_dataset(f)
+                    starts.append(file_start_time(file_path))
+                    rows.append(found[1].shape[0] if found else 0)
+            known = [(t, n) for t, n in zip(starts, rows) if t is not None]
+            rate = estimate_rate([t for t, _ in known], [n for _, n in known])
+            for file_path, file_start, n in zip(files, starts, rows):
+                if n == 0 or (file_start is not None and (file_start >= end or file_start + n / rate <= start)):
+                    continue
+                with h5py.File(file_path, "r") as f:
+                    dset = find_waveform_dataset(f)[1]
+                    time_dset = find_time_dataset(f, n)
+                    # Only the rows inside the window are read
+                    if time_dset is not None:
+                        t = time_dset[()].astype(np.float64)
+                        row0, row1 = np.searchsorted(t, [start, end])
+                        t = t[row0:row1]
+                    elif file_start is not None:
+                        row0 = int(np.clip(np.floor((start - file_start) * rate), 0, n))
+                        row1 = int(np.clip(np.ceil((end - file_start) * rate), 0, n))
+                        t = file_start + np.arange(row0, row1) / rate
+                    else:
+                        continue
+                    if row1 <= row0:
+                        continue
+                    values = signed_ptp(dset[row0:row1])
+                keep = (t >= start) & (t < end)
+                pixel = np.clip(np.searchsorted(edges, t[keep], side='right') - 1, 0, width - 1)
+                np.minimum.at(vmin, pixel, values[keep])
+                np.maximum.at(vmax, pixel, values[keep])
+        vmin[np.isinf(vmin)] = np.nan
+        vmax[np.isinf(vmax)] = np.nan
+        times = (edges[:-1] + edges[1:]) / 2
+        return self.envelope_plot(times, vmin, vmax, None, width, height, theme, f"{station} signed peak-to-peak", "p2p [ADU]")
+
+    def envelope_plot(self, times, vmin, vmax, vmean, width, height, theme, title, ylabel):
+        colors = theme_colors(theme)
+        fig = Figure(figsize=(width / 100, height / 100), dpi=100)
+        fig.patch.set_facecolor(colors['figure_facecolor'])
+        ax = fig.add_subplot()
+        ax.set_facecolor(colors['bg_color'])
+        x = [datetime.fromtimestamp(t, timezone.utc) for t in times]
+        ax.fill_between(x, vmin, vmax, color=colors['line_color1'], alpha=0.4, linewidth=0)
+        if vmean is not None:
+            ax.plot(x, vmean, color=colors['line_color2'], linewidth=0.8)
+        ax.tick_params(colors=colors['text_color'])
+        for spine in ax.spines.values():
+            spine.set_edgecolor(colors['text_color'])
+        ax.set_title(title, color=colors['text_color'])
+        ax.set_ylabel(ylabel, color=colors['text_color'])
+        ax.set_xlabel("UTC", color=colors['text_color'])
+        ax.grid(color=colors['grid_color'], linewidth=0.4, linestyle="dashed")
+        return figure_to_bytes(fig, colors)
+
+
+def signed_ptp(rows):
+    # Peak-to-peak per rotation, negative when the minimum comes after the maximum
+    span = rows.max(axis=1).astype(np.float64) - rows.min(axis=1)
+    return np.where(np.argmin(rows, axis=1) < np.argmax(rows, axis=1), span, -span)
+
+
+def make_handler(quicklooks, cache):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                if url.path == "/":
+                    return self.reply(200, INDEX.encode(), "text/html")
+                if url.path == "/stats":
+                    return self.reply(200, json.dumps(cache.stats()).encode(), "application/json")
+                station = q.get("station", "THUNDERMILL01")
+                if not STATION_PATTERN.fullmatch(station):
+                    raise ValueError("station may only contain letters, digits, _ and -")
+                theme = q.get("theme", "light")
+                if theme not in ("light", "dark"):
+                    raise ValueError("theme must be light or dark")
+                if url.path == "/helicorder":
+                    date = q.get("date") or datetime.now(timezone.utc).strftime("%Y%m%d")
+                    if not re.fullmatch(r"\d{8}", date):
+                        raise ValueError("date must be YYYYMMDD")
+                    day_start = datetime.strptime(date, "%Y%m%d").replace(tzinfo=timezone.utc).timestamp()
+                    key = ("helicorder", station, date, theme, fresh_key(day_start, day_start + 86400))
+                    render = lambda: quicklooks.helicorder(station, date, theme)
+                elif url.path in ("/window", "/p2p"):
+                    start = parse_time(q["start"])
+                    end = parse_time(q["end"])
+                    width = min(max(int(q.get("width", 1200)), 100), 4000)
+                    height = min(max(int(q.get("height", 400)), 100), 2000)
+                    if end <= start:
+                        raise ValueError("end must be after start")
+                    product = getattr(quicklooks, url.path[1:])
+                    key = (url.path[1:], station, start, end, width, height, theme, fresh_key(start, end))
+                    render = lambda: product(station, start, end, width, height, theme)
+                else:
+                    return self.reply(404, b"Not found\n", "text/plain")
+                return self.reply(200, cache.get(key, render), "image/png")
+            except (KeyError, ValueError) as e:
+                return self.reply(400, f"Bad request: {e}\n".encode(), "text/plain")
+            except LookupError as e:
+                return self.reply(404, f"{e}\n".encode(), "text/plain")
+            except Exception as e:
+                return self.reply(500, f"Render failed: {e}\n".encode(), "text/plain")
+
+        def reply(self, code, body, content_type):
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def main():
+    args = parse_arguments()
+    cache = RenderCache(int(args.cache_mb * 1024 * 1024), args.render_workers)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(Quicklooks(args), cache))
+    print(f"Serving EFI quicklooks on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+import argparse
+import h5py
+import numpy as np
+from datetime import datetime, timezone
+
+# Synthetic waveform archive in the layout plot.py reads:
+# INPUT/YYYY/MM/DD/STATION_YYYYMMDD_HHMMSS.h5 with a "waveform" dataset of
+# one row per mill rotation and one column per sample of the rotation.
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Generate a synthetic EFM waveform archive for benchmarking plot.py.')
+    parser.add_argument('--output', type=str, required=True, help='Root directory of the archive')
+    parser.add_argument('--date', type=str, default='20240710', help='Day to generate in YYYYMMDD format (default: 20240710)')
+    parser.add_argument('--station', type=str, action='append', help='Station prefix, repeat for several stations (default: THUNDERMILL01)')
+    parser.add_argument('--files', type=int, default=48, help='Files per day, evenly covering 24 hours (default: 48)')
+    parser.add_argument('--rate', type=float, default=50.0, help='Rotations (rows) per second (default: 50)')
+    parser.add_argument('--columns', type=int, default=40, help='Samples per rotation (default: 40)')
+    parser.add_argument('--channels', type=int, nargs=2, default=[13, 33], metavar=('A', 'B'), help='Columns whose difference carries the field (default: 13 33)')
+    parser.add_argument('--calibration', type=float, default=1/1.4244*1000, help='ADU of the channel difference per kV/m (default: 701.98)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    return parser.parse_args()
+
+
+def field_series(rng, n, rate):
+    """Field in kV/m: fair weather with a daily swing, slow drift and a few storm episodes."""
+    t = np.arange(n) / rate
+    field = 0.12 + 0.05 * np.sin(2 * np.pi * (t / 86400 - 0.3))
+    # Drift as a random walk sampled once a minute
+    minutes = int(n / rate / 60) + 2
+    drift = np.cumsum(rng.normal(0, 0.01, minutes))
+    field += np.interp(t, np.arange(minutes) * 60, drift)
+    for _ in range(rng.integers(1, 4)):
+        center = rng.uniform(0, t[-1] if n else 1)
+        width = rng.uniform(600, 3600)
+        envelope = np.exp(-0.5 * ((t - center) / width) ** 2)
+        # Storm field swings sign every few minutes, lightning makes steps
+        swings = np.sin(2 * np.pi * t / rng.uniform(120, 600) + rng.uniform(0, 2 * np.pi))
+        field += envelope * rng.uniform(3, 10) * swings
+    return field
+
+
+def rotation_block(rng, field, columns, channels, calibration):
+    # Each row is a sine over the rotation, phase chosen so that the two
+    # channels sit at opposite extremes; their difference is field * calibration
+    a, b = channels
+    phase = 2 * np.pi * np.arange(columns) / columns
+    shift = np.pi / 2 - phase[a]
+    shape = np.sin(phase + shift)
+    gain = calibration / max(shape[a] - shape[b], 1e-6)
+    rows = 2048 + np.outer(field * gain, shape) + rng.normal(0, 15, (len(field), columns))
+    return np.round(rows).astype(np.int32)
+
+
+def write_file(path, block):
+    tmp_path = path + ".tmp"
+    with h5py.File(tmp_path, "w") as f:
+        f.create_dataset("waveform", data=block, chunks=(min(1024, len(block)), block.shape[1]))
+    os.replace(tmp_path, path)
+
+
+def generate_day(output, date, station_prefix, files, rate, columns, channels, calibration, seed):
+    day = datetime.strptime(date, "%Y%m%d").replace(tzinfo=timezone.utc)
+    date_path = os.path.join(output, day.strftime("%Y"), day.strftime("%m"), day.strftime("%d"))
+    os.makedirs(date_path, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    rows = int(round(86400 * rate))
+    field = field_series(rng, rows, rate)
+    bounds = np.linspace(0, rows, files + 1).astype(np.int64)
+    paths = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        seconds = int(start / rate)
+        name = f"{station_prefix}_{date}_{seconds // 3600:02d}{seconds // 60 % 60:02d}{seconds % 60:02d}.h5"
+        path = os.path.join(date_path, name)
+        write_file(path, rotation_block(rng, field[start:stop], columns, channels, calibration))
+        paths.append(path)
+    return paths
+
+
+def main():
+    args = parse_arguments()
+    stations = args.station or ['THUNDERMILL01']
+    for i, station_prefix in enumerate(stations):
+        paths = generate_day(args.output, args.date, station_prefix, args.files, args.rate, args.columns,
+                             args.channels, args.calibration, args.seed + i)
+        size = sum(os.path.getsize(p) for p in paths)
+        print(f"{station_prefix}: wrote {len(paths)} files, {size / 1e6:.1f} MB under {os.path.dirname(paths[0])}")
+
+
+if __name__ == "__main__":
+    main()
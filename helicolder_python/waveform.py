@@ -0,0 +1,147 @@
+import os
+import re
+import h5py
+import numpy as np
+from datetime import datetime, timezone
+
+# Rows per read for datasets stored without chunking
+DEFAULT_BLOCK_ROWS = 65536
+
+# Per-row timestamp datasets looked up next to the waveform
+TIME_DATASETS = ("time", "timestamp", "timestamps")
+
+# Start time in archive file names, STATION_YYYYMMDD_HHMMSS.h5; minutes and
+# seconds may be missing (STATION_YYYYMMDD_HH*.h5, the older hourly layout)
+FILE_TIME_PATTERN = re.compile(r"_(\d{8})_(\d{2})(\d{2})?(\d{2})?")
+
+# Rotations per second of the mills, used when it cannot be estimated
+DEFAULT_RATE = 50.0
+
+
+def find_2d_dataset(h5obj):
+    for name, item in h5obj.items():
+        if isinstance(item, h5py.Dataset) and item.ndim == 2:
+            return name, item
+        elif isinstance(item, h5py.Group):
+            found = find_2d_dataset(item)
+            if found:
+                return found
+    return None
+
+
+def find_waveform_dataset(f):
+    if "waveform" in f:
+        return "waveform", f["waveform"]
+    return find_2d_dataset(f)
+
+
+def find_time_dataset(f, rows):
+    for name in TIME_DATASETS:
+        if name in f and isinstance(f[name], h5py.Dataset) and f[name].shape == (rows,):
+            return f[name]
+    return None
+
+
+def split_file_name(path):
+    """(station, start in epoch seconds UTC) from a file name; (stem, None) when it carries no start time."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    matches = list(FILE_TIME_PATTERN.finditer(stem))
+    if not matches:
+        return stem, None
+    match = matches[-1]
+    day, hour, minute, second = match.groups()
+    try:
+        start = datetime.strptime(f"{day}{hour}{minute or '00'}{second or '00'}", "%Y%m%d%H%M%S")
+    except ValueError:
+        return stem, None
+    return stem[:match.start()], start.replace(tzinfo=timezone.utc).timestamp()
+
+
+def file_start_time(path):
+    # Epoch seconds (UTC) from the file name, None when it does not carry one
+    return split_file_name(path)[1]
+
+
+def estimate_rate(starts, rows, default=DEFAULT_RATE):
+    """Rows per second from the start times and row counts of consecutive files.
+
+    A gap after a file only lowers that file's ratio, so the median over the
+    day stays at the true rate unless most files are followed by a gap.
+    """
+    starts = np.asarray(starts, dtype=np.float64)
+    rows = np.asarray(rows, dtype=np.float64)
+    span = np.diff(starts)
+    ok = span > 0
+    if not ok.any():
+        return default
+    return float(np.median(rows[:-1][ok] / span[ok]))
+
+
+def block_rows(dset, target_rows=DEFAULT_BLOCK_ROWS):
+    # Row block size covering whole chunks, so every chunk is decompressed once
+    if dset.chunks:
+        chunk_rows = dset.chunks[0]
+        return max(target_rows // chunk_rows, 1) * chunk_rows
+    return target_rows
+
+
+def _row_blocks(dset, target_rows=DEFAULT_BLOCK_ROWS):
+    # (start, stop, block) of chunk-aligned row blocks, all read into one reused buffer
+    rows = dset.shape[0]
+    step = block_rows(dset, target_rows)
+    buf = np.empty((min(step, rows),) + dset.shape[1:], dtype=dset.dtype)
+    for start in range(0, rows, step):
+        stop = min(start + step, rows)
+        n = stop - start
+        dset.read_direct(buf, source_sel=np.s_[start:stop], dest_sel=np.s_[0:n])
+        yield start, stop, buf[:n]
+
+
+def _column_blocks(dset, columns, target_rows=DEFAULT_BLOCK_ROWS):
+    # (start, stop, block) of chunk-aligned row blocks holding only the given
+    # columns. When the chunks are narrower than a row, only the chunk columns
+    # holding wanted columns are read, one hyperslab per chunk column so each
+    # chunk is still decompressed once; otherwise whole rows are read and the
+    # columns copied out.
+    columns = list(columns)
+    if not dset.chunks or dset.chunks[1] >= dset.shape[1]:
+        for start, stop, block in _row_blocks(dset, target_rows):
+            yield start, stop, block[:, columns]
+        return
+    width = dset.chunks[1]
+    groups = {}
+    for i, column in enumerate(columns):
+        groups.setdefault(column // width, []).append((i, column))
+    step = block_rows(dset, target_rows)
+    for start in range(0, dset.shape[0], step):
+        stop = min(start + step, dset.shape[0])
+        block = np.empty((stop - start, len(columns)), dtype=dset.dtype)
+        for group in groups.values():
+            lo = min(column for _, column in group)
+            hi = max(column for _, column in group) + 1
+            part = dset[start:stop, lo:hi]
+            for i, column in group:
+                block[:, i] = part[:, column - lo]
+        yield start, stop, block
+
+
+def read_columns(dset, columns, target_rows=DEFAULT_BLOCK_ROWS):
+    """Read only the given columns of a 2D dataset.
+
+    The dataset is read in chunk-aligned row blocks, so memory is bounded by
+    the block and never holds the full dataset; with column-chunked files only
+    the chunks of the wanted columns are read. Returns an array of shape
+    (rows, len(columns)).
+    """
+    out = np.empty((dset.shape[0], len(columns)), dtype=dset.dtype)
+    for start, stop, block in _column_blocks(dset, columns, target_rows):
+        out[start:stop] = block
+    return out
+
+
+def read_channel_difference(dset, channels, target_rows=DEFAULT_BLOCK_ROWS):
+    """channels[0] - channels[1] of every row, read block by block."""
+    out = np.empty(dset.shape[0], dtype=np.result_type(dset.dtype, np.int32) if dset.dtype.kind in "iu" else dset.dtype)
+    for start, stop, block in _column_blocks(dset, channels, target_rows):
+        np.subtract(block[:, 0], block[:, 1], out=out[start:stop], dtype=out.dtype)
+    return out
@@ -1,30 +1,153 @@
 #!/usr/bin/env python
 
+import argparse
+import os
+import sys
+import time
+import numpy as np
 import matplotlib.pyplot as plt
-import serial
-from collections import deque
-i
-ser = serial.Serial('/dev/ttyUSB0')
-
-fig = plt.figure("EFM")
-
-while True:
-
-	try:
-		line = ser.readline()
-
-		wave = [int(item) if item.isdigit() else 0 for item in line.decode().split(',')]
-	except:
-		continue
-    
-    wave[100]
-	plt.plot(wave[100])
-
-	plt.ylim(0,511)
-	plt.xlabel('Phase [a.u.]')
-	plt.ylabel('Electric Field [a.u.]')
-	
-	# DRAW, PAUSE AND CLEAR
-	plt.draw()
-	plt.pause(0.5)
-	plt.clf()
+
+# Same conversion as the original plot.py
+KV_PER_ADU = (3/5.5)*2.5/(139-129)
+
+
+def parse_line(line):
+	# Line ending stripped as by efmplot's frame parser, so the last column is
+	# kept here just as on the frame bus
+	return [int(item) if item.isdigit() else 0 for item in line.strip().decode().split(',')]
+
+
+class LiveViewer:
+	# Waveform line and a waterfall (rotation phase against time) drawn by
+	# blitting. The waterfall is a numpy ring: every frame overwrites one row
+	# in place and a cursor marks the newest row, nothing is shifted or copied.
+
+	def __init__(self, rows=600, calibrated=False, max_fps=20):
+		self.rows = rows
+		self.calibrated = calibrated
+		self.min_interval = 1.0 / max_fps
+		self.ring = None
+		self.pos = 0
+		self.last_draw = 0.0
+		self.fig = None
+
+	def _setup(self, width):
+		self.width = width
+		self.ring = np.full((self.rows, width), np.nan, dtype=np.float32)
+		if self.calibrated:
+			plt.rcParams.update({'font.size': 20})
+			self.phase = np.linspace(0, 180, width)
+			ylim, extent = (-40, 40), (0, 180, self.rows, 0)
+			xlabel, ylabel = 'Rotor Phase [°]', 'Electric Field [kV/m]'
+		else:
+			self.phase = np.arange(width)
+			ylim, extent = (0, 511), (0, width - 1, self.rows, 0)
+			xlabel, ylabel = 'Phase [a.u.]', 'Electric Field [a.u.]'
+
+		self.fig, (self.ax_wave, self.ax_fall) = plt.subplots(2, 1, num="EFM", clear=True, sharex=True, gridspec_kw={'height_ratios': [1, 2]})
+		self.ax_wave.set_title('Electric Field Mill')
+		self.ax_wave.set_ylim(*ylim)
+		self.ax_wave.set_ylabel(ylabel)
+		(self.line,) = self.ax_wave.plot(self.phase, np.full(width, np.nan), lw=3 if self.calibrated else 1.5, animated=True)
+
+		self.image = self.ax_fall.imshow(self.ring, aspect='auto', interpolation='nearest', extent=extent,
+			vmin=ylim[0], vmax=ylim[1], cmap='RdBu_r' if self.calibrated else 'viridis', animated=True)
+		self.cursor = self.ax_fall.axhline(0, color='red', lw=1, animated=True)
+		self.ax_fall.set_xlabel(xlabel)
+		self.ax_fall.set_ylabel('Rotation (ring, newest at cursor)')
+		self.fig.colorbar(self.image, ax=self.ax_fall, label=ylabel)
+
+		self.fig.tight_layout()
+		self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+		plt.show(block=False)
+		self.fig.canvas.draw()
+
+	def _on_draw(self, event):
+		# Static parts (axes, labels) are cached, animated artists are blitted on top
+		self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+		self._draw_artists()
+
+	def _draw_artists(self):
+		self.ax_wave.draw_artist(self.line)
+		self.ax_fall.draw_artist(self.image)
+		self.ax_fall.draw_artist(self.cursor)
+
+	def add(self, wave):
+		if self.ring is None:
+			if len(wave) < 2:
+				return
+			self._setup(len(wave))
+		row = self.ring[self.pos]
+		n = min(len(wave), self.width)
+		row[:n] = wave[:n]
+		row[n:] = np.nan
+		if self.calibrated:
+			row[:n] -= 256
+			row[:n] *= KV_PER_ADU
+		self.pos = (self.pos + 1) % self.rows
+
+	def refresh(self, now):
+		if self.ring is None or now - self.last_draw < self.min_interval:
+			return
+		self.last_draw = now
+		newest = (self.pos - 1) % self.rows
+		canvas = self.fig.canvas
+		canvas.restore_region(self.background)
+		self.line.set_ydata(self.ring[newest])
+		self.image.set_data(self.ring)
+		self.cursor.set_ydata([newest, newest])
+		self._draw_artists()
+		canvas.blit(self.fig.bbox)
+		canvas.flush_events()
+
+
+def follow_bus(viewer, name):
+	# Another process owns the serial port, frames come as views of its ring
+	sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'efmplot'))
+	from frame_bus import FrameBusReader
+
+	bus = FrameBusReader(name, timeout=30)
+	while not bus.closed and (viewer.fig is None or plt.fignum_exists(viewer.fig.number)):
+		start, count = bus.wait(timeout=0.05)
+		# Only the rotations that still fit into the waterfall
+		skip = max(count - viewer.rows, 0)
+		for view in bus.views(start + skip, count - skip):
+			for row in view:
+				viewer.add(row)
+		viewer.refresh(time.monotonic())
+	if bus.lost:
+		print(f"Missed {bus.lost} frames")
+
+
+def main(calibrated=False):
+	parser = argparse.ArgumentParser(description='Live EFM waveform and waterfall viewer.')
+	parser.add_argument('--port', default='/dev/ttyUSB0', help='Serial port to read data from')
+	parser.add_argument('--baudrate', default=9600, type=int, help='Baudrate for serial port')
+	parser.add_argument('--rows', default=600, type=int, help='Rotations kept in the waterfall')
+	parser.add_argument('--fps', default=20, type=float, help='Maximum redraw rate')
+	parser.add_argument('--shm', default=None, metavar='NAME', help='Read frames from the shared memory frame bus of efmplot.py --shm NAME instead of the serial port')
+	args = parser.parse_args()
+
+	viewer = LiveViewer(rows=args.rows, calibrated=calibrated, max_fps=args.fps)
+	if args.shm:
+		follow_bus(viewer, args.shm)
+		return
+
+	import serial
+	ser = serial.Serial(args.port, args.baudrate, timeout=0.05)
+
+	pending = b''
+	while viewer.fig is None or plt.fignum_exists(viewer.fig.number):
+		# Drain everything buffered, then redraw at most once
+		pending += ser.read(max(ser.in_waiting, 1))
+		*lines, pending = pending.split(b'\n')
+		for line in lines:
+			try:
+				viewer.add(parse_line(line))
+			except UnicodeDecodeError:
+				continue
+		viewer.refresh(time.monotonic())
+
+
+if __name__ == "__main__":
+	main()